@@ -0,0 +1,20 @@
+"""Import single server modules without importing their packages.
+
+Importing the index package loads the default segment as a side effect, so
+the bin scripts load the standard-library-only modules they need directly.
+"""
+
+import importlib.util
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_module(name, path):
+    """Return the module at path, relative to the repository root."""
+    spec = importlib.util.spec_from_file_location(name, ROOT/path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
@@ -1,6 +1,7 @@
 """Flask API endpoints for the inverted index search."""
 from pathlib import Path  # noqa: E402 pylint: disable=wrong-import-position
 import os  # noqa: E402 pylint: disable=wrong-import-position
+import threading  # noqa: E402 pylint: disable=wrong-import-position
 # import index.api
 
 from flask import Flask
@@ -14,9 +15,44 @@ app.config["INDEX_PATH"] = os.getenv(
     INDEX_DIR/"inverted_index_1.txt"  # Default value
 )
 
+# Serve several segments from one process instead: INDEX_PATHS lists their
+# paths separated by os.pathsep (":" on Linux) and overrides INDEX_PATH
+app.config["INDEX_PATHS"] = [
+    path for path in os.getenv("INDEX_PATHS", "").split(os.pathsep) if path
+]
+
+# Query scorer: "python", or "numpy" for the vectorized engine.  Falls back
+# to "python" if NumPy isn't installed.
+app.config["INDEX_SCORER"] = os.getenv("INDEX_SCORER", "python")
+
+# Query result cache: byte budget (0 disables it) and time-to-live in seconds
+# (0 keeps entries until they are evicted or the segment is reloaded)
+app.config["INDEX_CACHE_BYTES"] = os.getenv("INDEX_CACHE_BYTES", str(32 << 20))
+app.config["INDEX_CACHE_TTL"] = os.getenv("INDEX_CACHE_TTL", "0")
+
+# Cache of per-query tf-idf similarities, re-blended with PageRank when only
+# the weight changes: byte budget, 0 disables it.  Shares INDEX_CACHE_TTL.
+app.config["INDEX_SIM_CACHE_BYTES"] = os.getenv(
+    "INDEX_SIM_CACHE_BYTES", str(64 << 20)
+)
+
+# Compress API responses of at least this many bytes with gzip or deflate,
+# for clients that accept it.  0 disables compression.
+app.config["INDEX_COMPRESS_BYTES"] = os.getenv("INDEX_COMPRESS_BYTES", "0")
+
+# Cache-Control max-age of hits responses in seconds.  0 lets caches store
+# them but revalidate every time, against the ETag of the segment version.
+app.config["INDEX_HITS_MAX_AGE"] = os.getenv("INDEX_HITS_MAX_AGE", "0")
+
 # Import API AFTER app is created?
 import index.api  # noqa: E402 pylint: disable=wrong-import-position
 
+# Reload the segment in the background on SIGUSR2 (bin/index reload),
+# ignoring the signal until the first load is done rather than dying of it.
+# gunicorn workers install the handler again, see gunicorn_config.py.
+if threading.current_thread() is threading.main_thread():
+    index.api.reload.install_signal_handler()
+
 # Load index/pagerank/stopwords into memory
 index.api.register_blueprints(app)
-index.api.load_index()
+index.api.reload.load()
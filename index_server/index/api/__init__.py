@@ -1,11 +1,55 @@
 """index/api/__init__.py from flask import current_app."""
+import concurrent.futures  # noqa: E402
+import gc  # noqa: E402 pylint: disable=wrong-import-position
+from array import array  # noqa: E402 pylint: disable=wrong-import-position
 from pathlib import Path  # noqa: E402 pylint: disable=wrong-import-position
+from typing import Any, NamedTuple  # noqa: E402
 from index import app  # noqa: E402 pylint: disable=wrong-import-position
+from index.api.cache import RECENT_KEYS, ResultCache  # noqa: E402
+from index.segment import (  # noqa: E402
+    Segment, is_segment, load_text_segment,
+)
 
-# Globals to hold your loaded data
-INVERTED_INDEX = {}
-STOPWORDS = set()
-PAGERANK = {}
+
+class LoadedSegment(NamedTuple):
+    """Everything a query reads from one loaded segment.
+
+    inverted_index maps term -> PostingList: a dict for text segments, an
+    mmap-backed Segment for binary segments.  Postings hold dense doc
+    ordinals: docids[ordinal] is the external docid and pagerank[ordinal]
+    its PageRank.
+    """
+
+    path: Path
+    version: str
+    inverted_index: Any
+    stopwords: frozenset
+    docids: Any
+    pagerank: array
+
+    # Largest PageRank in this segment, an upper bound for query pruning
+    max_pagerank: float
+
+    # Query results and weight-independent tf-idf similarities
+    result_cache: ResultCache
+    sim_cache: ResultCache
+
+    # Weight each recent query was last seen with, so the sims are only
+    # cached once a query comes back with another weight
+    sim_weights: ResultCache
+
+
+# The segments being served, one per INDEX_PATHS entry.  load_index() reads
+# new LoadedSegments and publishes them with one assignment, so a request
+# that reads SEGMENTS once sees a single consistent version even while a
+# reload is running.
+SEGMENTS = ()
+
+# Threads that search the segments of a multi-segment server in parallel.
+# NumPy kernels release the GIL, so the numpy scorer overlaps segments.
+SEGMENT_POOL = concurrent.futures.ThreadPoolExecutor(
+    thread_name_prefix="segment"
+)
 
 
 def register_blueprints(flask_app):
@@ -13,49 +57,84 @@ def register_blueprints(flask_app):
     flask_app.register_blueprint(bp)
 
 
-def load_index():
-    """Load into memory."""
-    index_path = Path(app.config["INDEX_PATH"])
-    base_dir = index_path.parent.parent
+def index_paths():
+    """Return the configured segment paths: INDEX_PATHS, else INDEX_PATH."""
+    paths = app.config.get("INDEX_PATHS") or [app.config["INDEX_PATH"]]
+    return [Path(path) for path in paths]
+
+
+def segment_version(index_path):
+    """Return a version string that changes when the segment file does."""
+    stat = Path(index_path).stat()
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def read_shared(base_dir):
+    """Return (stopwords, {docid: PageRank}) from an index directory."""
     stopwords_path = base_dir / "stopwords.txt"
     pagerank_path = base_dir / "pagerank.out"
 
-    STOPWORDS.clear()
     with open(stopwords_path, "r", encoding="utf-8") as f:
-        for line in f:
-            STOPWORDS.add(line.strip())
+        stopwords = frozenset(line.strip() for line in f)
 
-    PAGERANK.clear()
+    pagerank = {}
     with open(pagerank_path, "r", encoding="utf-8") as f:
         for line in f:
             doc_id, rank = line.split(",")
-            PAGERANK[doc_id] = float(rank)
+            pagerank[int(doc_id)] = float(rank)
+    return stopwords, pagerank
 
-    INVERTED_INDEX.clear()
-    with open(index_path, "r", encoding="utf-8") as f:
-        for line in f:
-            parts = line.strip().split()
-            if not parts:
-                continue
-
-            term = parts[0]
-            idf = float(parts[1])
-
-            postings = {}
-            # fields: docid tf norm in groups of 3
-            for i in range(2, len(parts), 3):
-                doc_id = parts[i]
-                tf = int(parts[i + 1])
-                doc_len = float(parts[i + 2])
-                postings[doc_id] = {
-                    "tf": tf,
-                    "doc_len": doc_len,
-                }
-
-            INVERTED_INDEX[term] = {
-                "idf": idf,
-                "docs": postings,
-            }
+
+def read_segment(index_path, stopwords, pagerank):
+    """Read the segment at index_path, given read_shared() of its directory."""
+    # Binary segments are mmap'd and decoded lazily, term by term
+    version = segment_version(index_path)
+    if is_segment(index_path):
+        inverted_index = Segment(index_path)
+        docids = inverted_index.doc_table
+    else:
+        inverted_index, docids = load_text_segment(index_path)
+
+    # Flat PageRank array indexed by doc ordinal.  Segments partition the
+    # documents, so a multi-segment server holds one PageRank per document.
+    ranks = array("d", (pagerank.get(docid, 0.0) for docid in docids))
+
+    # Fresh caches, so nothing from the previous segment survives a reload
+    ttl = float(app.config["INDEX_CACHE_TTL"])
+    return LoadedSegment(
+        path=index_path,
+        version=version,
+        inverted_index=inverted_index,
+        stopwords=stopwords,
+        docids=docids,
+        pagerank=ranks,
+        max_pagerank=max(ranks, default=0.0),
+        result_cache=ResultCache(int(app.config["INDEX_CACHE_BYTES"]), ttl),
+        sim_cache=ResultCache(int(app.config["INDEX_SIM_CACHE_BYTES"]), ttl),
+        sim_weights=ResultCache(RECENT_KEYS),
+    )
+
+
+def load_index():
+    """Load the configured segments into memory and start serving them."""
+    global SEGMENTS  # pylint: disable=global-statement
+
+    # Segments in the same index directory share stopwords and PageRank
+    shared = {}
+    segments = []
+    for index_path in index_paths():
+        base_dir = index_path.parent.parent
+        if base_dir not in shared:
+            shared[base_dir] = read_shared(base_dir)
+        segments.append(read_segment(index_path, *shared[base_dir]))
+    SEGMENTS = tuple(segments)
+
+    # Exempt everything loaded so far from garbage collection.  Collections
+    # write to the header of every tracked object, which would copy the
+    # index pages into each worker forked after loading (gunicorn
+    # --preload); frozen objects stay shared.
+    gc.collect()
+    gc.freeze()
 
 
 from .main import bp  # noqa: E402 pylint: disable=wrong-import-position
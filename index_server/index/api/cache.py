@@ -0,0 +1,116 @@
+"""Bounded in-process cache of query results."""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# PageRank weights are rounded to this many decimals, so slider positions
+# that only differ by float noise share a cache entry
+WEIGHT_DECIMALS = 3
+
+# Queries whose last weight the sim cache remembers, see entry_count()
+RECENT_KEYS = 1024
+
+# Approximate footprint of one cached (docid, score) hit
+HIT_BYTES = sys.getsizeof((0, 0.0)) + sys.getsizeof(0) + sys.getsizeof(0.0)
+
+
+def quantize_weight(weight):
+    """Return weight rounded to WEIGHT_DECIMALS."""
+    return round(weight, WEIGHT_DECIMALS)
+
+
+def query_key(q_tf, *args):
+    """Return a hashable key for a query's term counts and options.
+
+    q_tf is a Counter of query terms, so term order does not matter.
+    """
+    return (frozenset(q_tf.items()), *args)
+
+
+def result_size(value):
+    """Return the approximate size in bytes of a list of hits."""
+    return sys.getsizeof(value) + HIT_BYTES * len(value)
+
+
+def sims_size(value):
+    """Return the approximate size in bytes of (docids, sims) arrays.
+
+    Counts each array's data, not sys.getsizeof(), which already includes
+    the data of arrays that own it but not of NumPy views.
+    """
+    return sys.getsizeof(value) + sum(len(arr) * arr.itemsize for arr in value)
+
+
+def entry_count(_value):
+    """Return 1, so that a cache's max_bytes bounds its number of entries."""
+    return 1
+
+
+class ResultCache:
+    """Thread-safe LRU cache with a byte budget and optional TTL.
+
+    Entries are evicted least recently used first once their total size
+    exceeds max_bytes, and expire ttl seconds after insertion if ttl is
+    set.  max_bytes=0 disables the cache.
+    """
+
+    def __init__(self, max_bytes, ttl=None):
+        """Create an empty cache."""
+        self.max_bytes = max_bytes
+        self.ttl = ttl or None
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._entries = OrderedDict()  # key -> (value, size, expires)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None \
+                    and entry[2] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size=result_size):
+        """Cache value under key, evicting old entries to fit the budget.
+
+        size(value) estimates the entry's footprint in bytes.
+        """
+        nbytes = size(value)
+        if nbytes > self.max_bytes:
+            return
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, nbytes, expires)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        """Drop key, lock held."""
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        """Return the counters and current usage as a dict."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+            }
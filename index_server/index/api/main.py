@@ -1,121 +1,456 @@
 """Index/api/main.py."""
 
+import hashlib
+import heapq
+import itertools
 import math
+import os
 import re
+from array import array
 from collections import Counter
-from index.api import INVERTED_INDEX, STOPWORDS, PAGERANK
+from types import ModuleType
+from typing import NamedTuple, Optional
+from index import api, memory, wire
+from index.api import compression, reload, retrieval, vectorized
+from index.api.cache import (
+    entry_count, query_key, quantize_weight, sims_size,
+)
+from index.api.retrieval import (
+    score_conjunctive_top_k, score_disjunctive_top_k,
+)
 # from pathlib import Path
 # import index
-from flask import Blueprint, jsonify, request
+from flask import (
+    Blueprint, abort, current_app, jsonify, request, url_for,
+)
 
 
 CLEAN_RE = re.compile(r"[^a-zA-Z0-9 ]+")
+PHRASE_RE = re.compile(r'"([^"]*)"')
 
 bp = Blueprint("api", __name__, url_prefix="/api/v1")
 
 
+@bp.after_request
+def compress(response):
+    """Compress large responses, see INDEX_COMPRESS_BYTES."""
+    return compression.compress_response(
+        response, int(current_app.config.get("INDEX_COMPRESS_BYTES", 0))
+    )
+
+
 @bp.route("/", methods=["GET"])
 def api_root():
     """Return a list of services available."""
     return jsonify({
         "hits": "/api/v1/hits/",
+        "cache": "/api/v1/cache/",
+        "memory": "/api/v1/memory/",
+        "reload": "/api/v1/reload/",
+        "segments": "/api/v1/segments/",
         "url": "/api/v1/",
     })
 
 
-@bp.route("/hits/", methods=["GET"])
-def api_hits():
-    """GET /api/v1/hits/?q=<query>&w=<weight>."""
-    # (1) get query parameters
-    query = request.args.get("q", "")
-    weight_str = request.args.get("w", default="0.5")
+def parse_weight(weight_str):
+    """Parse the PageRank weight, defaulting to 0.5 and clamped to [0, 1]."""
     try:
         weight = float(weight_str)
     except ValueError:
         weight = 0.5
 
     # clamp weight to [0, 1] just to be safe
-    if weight < 0.0:
-        weight = 0.0
-    elif weight > 1.0:
-        weight = 1.0
+    return min(max(weight, 0.0), 1.0)
+
+
+def parse_limit(k_str):
+    """Parse the number of hits to return, None meaning all of them."""
+    try:
+        k = int(k_str)
+    except (TypeError, ValueError):
+        return None
+    return k if k > 0 else None
+
+
+def parse_op(op_str):
+    """Parse the query operator: "or", or the default "and"."""
+    return "or" if (op_str or "").casefold() == "or" else "and"
 
-    # (2) clean and tokenize query (same rules as pipeline)
+
+def parse_query(query, stopwords):
+    """Clean and tokenize query (same rules as pipeline), count terms."""
     text = CLEAN_RE.sub("", query)  # remove punctuation etc.
     text = text.casefold()          # lowercase
-    tokens = [t for t in text.split() if t and t not in STOPWORDS]
+    return Counter(t for t in text.split() if t and t not in stopwords)
+
 
-    # no terms left after cleaning/stopwords
-    if not tokens:
-        return jsonify({"hits": []})
+def parse_phrases(query, stopwords):
+    """Return the query's quoted phrases as tuples of (offset, term).
 
-    # (3) term frequency in query
-    q_tf = Counter(tokens)
+    Phrases are cleaned like the rest of the query.  Offsets count tokens
+    from the phrase's first term, stopwords included, matching the positions
+    the pipeline records.  A quoted single term is just a term.
+    """
+    phrases = []
+    for quoted in PHRASE_RE.findall(query):
+        tokens = CLEAN_RE.sub("", quoted).casefold().split()
+        terms = [(i, t) for i, t in enumerate(tokens) if t not in stopwords]
+        if len(terms) > 1:
+            first = terms[0][0]
+            phrases.append(tuple((i - first, term) for i, term in terms))
+    return tuple(phrases)
 
-    # AND semantics: all terms must be present in this segment
-    for term in q_tf:
-        if term not in INVERTED_INDEX:
-            return jsonify({"hits": []})
 
-    # (4) build query vector weights: w_q_t = TF * IDF
-    q_weights = {}
-    for term, freq in q_tf.items():
-        entry = INVERTED_INDEX[term]
-        idf = entry["idf"]
-        q_weights[term] = freq * idf  # float
+def query_unit_weights(q_tf, postings):
+    """Return the normalized query vector {term: w_q}, or None if zero."""
+    # w_q_t = TF * IDF
+    q_weights = {
+        term: freq * postings[term].idf for term, freq in q_tf.items()
+    }
 
     # query normalization
     q_norm_sq = sum(w * w for w in q_weights.values())
     if q_norm_sq == 0.0:
-        return jsonify({"hits": []})
+        return None
     q_norm = math.sqrt(q_norm_sq)
+    return {t: (w / q_norm) for t, w in q_weights.items()}
+
+
+def query_lists(q_tf, inverted_index, op="and"):
+    """Return [(PostingList, w_q)] for a parsed query, or None if no hits.
+
+    With op "and" all terms must be present in this segment, and the query
+    vector is normalized.  With "or" the missing ones are dropped and the
+    query vector is left unnormalized: segments hold different subsets of
+    the terms, so normalizing over the ones this segment has would put each
+    segment's scores on its own scale.  Within a segment the norm is a
+    constant factor, so the tf-idf ranking is the same either way.
+    """
+    postings = {term: inverted_index.get(term) for term in q_tf}
+    if op == "or":
+        postings = {t: plist for t, plist in postings.items() if plist}
+        q_weights = {
+            term: q_tf[term] * plist.idf for term, plist in postings.items()
+        }
+        if not any(q_weights.values()):
+            return None
+        return [(postings[term], w_q) for term, w_q in q_weights.items()]
+    if not postings or None in postings.values():
+        return None
+
+    q_unit = query_unit_weights(q_tf, postings)
+    if q_unit is None:
+        return None
+    return [(postings[term], w_q) for term, w_q in q_unit.items()]
+
+
+def scorer():
+    """Return the configured scoring engine module."""
+    if (current_app.config.get("INDEX_SCORER") == "numpy"
+            and vectorized.available()):
+        return vectorized
+    return retrieval
+
+
+class HitsArgs(NamedTuple):
+    """Parsed parameters of a hits request."""
+
+    query: str
+    weight: float
+    limit: Optional[int]
+    op: str
+    engine: ModuleType
+
+
+def match_sims(lists, args):
+    """Return (docids, tf-idf sims) of the op matches of lists."""
+    if args.op == "or":
+        return args.engine.disjunctive_sims(lists)
+    return args.engine.tfidf_sims(lists)
+
+
+def cached_sims(q_tf, segment, args):
+    """Return the query's (docids, tf-idf sims), cached across weights.
+
+    Return None instead if the sims are not cached and the query is better
+    answered by pruning to its limit.
+    """
+    sim_cache = segment.sim_cache
+    key = query_key(q_tf, args.engine.__name__, args.op)
+    sims = sim_cache.get(key)
+    if sims is None:
+        # Pruning beats scoring every match, unless the query comes back
+        # with another weight, so only cache the sims the second time
+        previous = segment.sim_weights.get(key)
+        segment.sim_weights.put(key, args.weight, entry_count)
+        if args.engine is not vectorized and args.limit is not None \
+                and previous in (None, args.weight):
+            return None
+        lists = query_lists(q_tf, segment.inverted_index, args.op)
+        if lists is None:
+            sims = (array("I"), array("d"))
+        else:
+            sims = match_sims(lists, args)
+        sim_cache.put(key, sims, sims_size)
+    return sims
+
+
+def phrase_search(q_tf, phrases, segment, args):
+    """Return the best hits among the documents containing every phrase.
+
+    Phrases are rare, so matching them first leaves few candidates to score
+    and neither the sim cache nor pruning is used.
+    """
+    inverted_index = segment.inverted_index
+    lists = query_lists(q_tf, inverted_index, args.op)
+
+    # Phrases are required whatever the op, so all their terms must be here
+    terms = {term for phrase in phrases for _, term in phrase}
+    if lists is None or any(term not in inverted_index for term in terms):
+        return []
+
+    candidates = retrieval.phrase_docids([
+        [(inverted_index[term], offset) for offset, term in phrase]
+        for phrase in phrases
+    ])
+    docids, sims = retrieval.candidate_sims(
+        lists, candidates, args.op == "and"
+    )
+    return retrieval.blend(
+        docids, sims, args.weight, segment.pagerank, args.limit
+    )
+
+
+def search(q_tf, segment, args):
+    """Return the best (doc ordinal, score) hits for a parsed query."""
+    engine, pagerank = args.engine, segment.pagerank
+    weight, limit = args.weight, args.limit
+
+    # OR queries with common terms match most of the segment, so with a
+    # limit they are always pruned (or, by the NumPy engine, scored in bulk)
+    # rather than scored in full and cached
+    prune_or = args.op == "or" and limit is not None
 
-    # Pre-normalized query unit weights
-    q_unit = {t: (w / q_norm) for t, w in q_weights.items()}
+    # Re-blend cached similarities when a new weight arrives for the same
+    # query, without touching the postings
+    if segment.sim_cache.max_bytes and not prune_or:
+        sims = cached_sims(q_tf, segment, args)
+        if sims is not None:
+            return engine.blend(*sims, weight, pagerank, limit)
 
-    # (5) find candidate docs: intersection of doc sets for all terms
-    doc_sets = [
-        set(INVERTED_INDEX[term]["docs"].keys())
-        for term in q_tf
-    ]
-    candidates = set.intersection(*doc_sets) if doc_sets else set()
-    if not candidates:
-        return jsonify({"hits": []})
+    # keep only the best k hits, sorted by score with docid tie-break
+    lists = query_lists(q_tf, segment.inverted_index, args.op)
+    if lists is None:
+        return []
+    if prune_or and engine is vectorized:
+        return engine.score_disjunctive_top_k(lists, weight, pagerank, limit)
+    if prune_or:
+        return score_disjunctive_top_k(
+            lists, weight, pagerank, segment.max_pagerank, limit
+        )
+    if engine is vectorized or limit is None:
+        return engine.blend(*match_sims(lists, args), weight, pagerank, limit)
+    return score_conjunctive_top_k(
+        lists, weight, pagerank, segment.max_pagerank, limit
+    )
 
-    results = []
 
-    # (6) score each candidate document
-    for docid in candidates:
-        tfidf_sim = 0.0
+def search_segment(segment, args):
+    """Return one segment's best (docid, score) hits, with external docids.
 
-        for term in q_tf:
-            entry = INVERTED_INDEX[term]
-            idf = entry["idf"]
-            posting = entry["docs"][docid]
-            tf = posting["tf"]
-            doc_len = posting["doc_len"]
+    Safe to run outside the request thread.
+    """
+    q_tf = parse_query(args.query, segment.stopwords)
+    phrases = parse_phrases(args.query, segment.stopwords)
+    key = query_key(q_tf, args.op, args.weight, args.limit, phrases)
+    hits = segment.result_cache.get(key)
+    if hits is None:
+        if phrases:
+            hits = phrase_search(q_tf, phrases, segment, args)
+        else:
+            hits = search(q_tf, segment, args)
+        segment.result_cache.put(key, hits)
 
-            if doc_len == 0.0:
-                continue  # safety, shouldn't happen
+    # map doc ordinals back to external docids
+    docids = segment.docids
+    return [(docids[ordinal], score) for ordinal, score in hits]
 
-            # normalized document weight
-            w_d = (tf * idf) / doc_len
-            # normalized query weight
-            w_q = q_unit[term]
 
-            tfidf_sim += w_d * w_q
+def merge_hits(segment_hits, limit):
+    """Merge ranked per-segment hits into the best limit hits overall."""
+    merged = heapq.merge(*segment_hits, key=lambda hit: (-hit[1], hit[0]))
+    return list(itertools.islice(merged, limit))
 
-        # (7) incorporate PageRank
-        pr_score = PAGERANK.get(docid, 0.0)
-        final_score = (1.0 - weight) * tfidf_sim + weight * pr_score
 
-        results.append({
-            "docid": int(docid),
-            "score": final_score,
+def hits_args():
+    """Return the HitsArgs of this hits request."""
+    weight = parse_weight(request.args.get("w", default="0.5"))
+
+    # With the result cache on, nearby weights share entries, so they must
+    # be scored the same way
+    if int(current_app.config["INDEX_CACHE_BYTES"]):
+        weight = quantize_weight(weight)
+    return HitsArgs(
+        query=request.args.get("q", ""),
+        weight=weight,
+        limit=parse_limit(request.args.get("k")),
+        op=parse_op(request.args.get("op")),
+        engine=scorer(),
+    )
+
+
+def hits_media_type():
+    """Return the hits format the client prefers: JSON, or binary."""
+    best = request.accept_mimetypes.best_match(
+        ["application/json", wire.HITS_MEDIA_TYPE]
+    )
+    return best if best == wire.HITS_MEDIA_TYPE else "application/json"
+
+
+def hits_etag(segments, engine, media_type):
+    """Return the ETag of this hits request's response from segments.
+
+    It changes with the segment versions, so it only matches a cached copy
+    computed from the segment files being served now.
+    """
+    key = "\n".join([
+        *(segment.version for segment in segments),
+        engine.__name__,
+        media_type,
+        request.query_string.decode("latin-1"),
+    ])
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+def hits_response(segments, engine, get_hits):
+    """Return the response for the (docid, score) hits get_hits() returns.
+
+    JSON by default, or the compact binary format if the client prefers it
+    in its Accept header.  Clients revalidating a copy with a matching
+    If-None-Match get a 304 without the query being evaluated.
+    """
+    media_type = hits_media_type()
+    etag = hits_etag(segments, engine, media_type)
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    elif media_type == wire.HITS_MEDIA_TYPE:
+        response = current_app.response_class(
+            wire.encode_hits(get_hits()), mimetype=media_type
+        )
+    else:
+        response = jsonify({
+            "hits": [
+                {"docid": docid, "score": score}
+                for docid, score in get_hits()
+            ]
         })
 
-    # (8) sort results by score descending
-    # (tie-break on docid for determinism; not required but nice)
-    results.sort(key=lambda x: (-x["score"], x["docid"]))
+    # Weak, because compression changes the bytes but not the hits
+    response.set_etag(etag, weak=True)
+    response.vary.add("Accept")
+    response.cache_control.public = True
+    max_age = int(current_app.config.get("INDEX_HITS_MAX_AGE", 0))
+    if max_age > 0:
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+@bp.route("/hits/", methods=["GET"])
+def api_hits():
+    """GET /api/v1/hits/?q=<query>&w=<weight>&k=<limit>&op=<and|or>.
+
+    Searches every segment served by this process, in parallel, and merges
+    the results.
+    """
+    args = hits_args()
+
+    # Read the served segments once: a reload swaps in new ones, and this
+    # request finishes on the version it started with
+    segments = api.SEGMENTS
+
+    def get_hits():
+        if len(segments) == 1:
+            return search_segment(segments[0], args)
+        futures = [
+            api.SEGMENT_POOL.submit(search_segment, segment, args)
+            for segment in segments
+        ]
+        return merge_hits(
+            [future.result() for future in futures], args.limit
+        )
+
+    return hits_response(segments, args.engine, get_hits)
+
+
+@bp.route("/segments/", methods=["GET"])
+def api_segments():
+    """Return the segments served by this process."""
+    return jsonify({
+        "segments": [
+            {
+                "path": str(segment.path),
+                "version": segment.version,
+                "documents": len(segment.docids),
+                "terms": len(segment.inverted_index),
+                "hits": url_for("api.api_segment_hits", number=number),
+            }
+            for number, segment in enumerate(api.SEGMENTS)
+        ]
+    })
+
+
+@bp.route("/segments/<int:number>/hits/", methods=["GET"])
+def api_segment_hits(number):
+    """GET /api/v1/segments/<number>/hits/: hits of one segment only."""
+    segments = api.SEGMENTS
+    if number >= len(segments):
+        abort(404)
+    args = hits_args()
+    return hits_response(
+        segments[number:number + 1], args.engine,
+        lambda: search_segment(segments[number], args),
+    )
+
+
+def combine_stats(stats):
+    """Return the per-segment cache stats of stats added up."""
+    total = dict(stats[0]) if stats else {}
+    for other in stats[1:]:
+        for name, value in other.items():
+            if name != "ttl":
+                total[name] += value
+    return total
+
+
+@bp.route("/cache/", methods=["GET"])
+def api_cache():
+    """Return cache counters, over all segments, since they were loaded."""
+    segments = api.SEGMENTS
+    return jsonify({
+        "results": combine_stats(
+            [segment.result_cache.stats() for segment in segments]
+        ),
+        "sims": combine_stats(
+            [segment.sim_cache.stats() for segment in segments]
+        ),
+    })
+
+
+@bp.route("/memory/", methods=["GET"])
+def api_memory():
+    """Return the memory use in kB of the process serving this request."""
+    return jsonify({"pid": os.getpid(), **memory.smaps_rollup()})
+
+
+@bp.route("/reload/", methods=["GET", "POST"])
+def api_reload():
+    """Report the served segment versions; POST starts a reload.
 
-    return jsonify({"hits": results})
+    Under gunicorn the POST reloads every worker, but the report is always
+    the one of the worker serving the request.
+    """
+    if request.method == "POST" and not reload.reload_all():
+        return jsonify(reload.status()), 409
+    return jsonify(reload.status()), 202 if request.method == "POST" else 200
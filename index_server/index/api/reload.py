@@ -0,0 +1,134 @@
+"""Zero-downtime reloads of the served segment.
+
+The new segment is read in a background thread while requests keep being
+served from the old one, then swapped in by load_index().  Requests already
+running finish on the version they started with.
+
+Under gunicorn every worker holds its own copy of the segments, so a reload
+requested from one worker signals all the workers of its master.
+"""
+
+import os
+import signal
+import struct
+import threading
+import time
+from index import api, app, memory
+
+# Guards STATUS, and so allows one reload at a time
+LOCK = threading.Lock()
+STATUS = {"state": "idle", "error": None, "started": None, "finished": None}
+
+# Sent by bin/index reload to every Index server process
+RELOAD_SIGNAL = signal.SIGUSR2
+
+
+def _reload():
+    """Load the segments again and record the outcome in STATUS.
+
+    STATUS leaves "loading" whatever happens, so a later reload can retry.
+    Unexpected errors still propagate and are logged by the thread.
+    """
+    state, error = "failed", "Unexpected error, see the server log"
+    try:
+        api.load_index()
+        state, error = "idle", None
+    except (OSError, ValueError, struct.error) as err:
+        error = str(err)
+        app.logger.error("Reloading segments failed: %s", err)
+    finally:
+        with LOCK:
+            STATUS.update(state=state, error=error, finished=time.time())
+
+
+def load():
+    """Load the segments in this thread, recorded in STATUS like a reload.
+
+    Used for the first load, so that a RELOAD_SIGNAL arriving meanwhile is
+    ignored like one arriving during any other reload.
+    """
+    with LOCK:
+        STATUS.update(
+            state="loading", error=None, started=time.time(), finished=None,
+        )
+    state = "failed"
+    try:
+        api.load_index()
+        state = "idle"
+    finally:
+        with LOCK:
+            STATUS.update(state=state, finished=time.time())
+
+
+def start_reload():
+    """Start reloading the segments in the background.
+
+    Returns False, without starting another, if a reload is still running.
+    """
+    with LOCK:
+        if STATUS["state"] == "loading":
+            return False
+        STATUS.update(
+            state="loading", error=None, started=time.time(), finished=None,
+        )
+    threading.Thread(target=_reload, name="index-reload", daemon=True).start()
+    return True
+
+
+def reload_all():
+    """Start reloading the segments in every process that serves them.
+
+    That is this process, or under gunicorn every worker of this one's
+    master (INDEX_MASTER_PID), which are sent RELOAD_SIGNAL.  Returns False,
+    without starting anything, if this process is still reloading.
+    """
+    master_pid = app.config.get("INDEX_MASTER_PID")
+    if master_pid is None:
+        return start_reload()
+    with LOCK:
+        if STATUS["state"] == "loading":
+            return False
+    for pid in memory.children(master_pid):
+        try:
+            os.kill(pid, RELOAD_SIGNAL)
+        except ProcessLookupError:  # exited meanwhile
+            continue
+    return True
+
+
+def status():
+    """Return the reload state and the segments being served."""
+    segments = [
+        {"path": str(segment.path), "version": segment.version}
+        for segment in api.SEGMENTS
+    ]
+    with LOCK:
+        return {**STATUS, "pid": os.getpid(), "segments": segments}
+
+
+def stale():
+    """Return True if a segment file changed since it was loaded."""
+    try:
+        versions = [api.segment_version(path) for path in api.index_paths()]
+    except OSError:
+        return False
+    return versions != [segment.version for segment in api.SEGMENTS]
+
+
+def _on_reload_signal(_signum, _frame):
+    """Hand the reload off to a thread, without taking LOCK here.
+
+    The handler runs on the main thread, which may be holding LOCK in
+    status() or start_reload() when the signal arrives.
+    """
+    threading.Thread(
+        target=start_reload, name="index-reload-signal", daemon=True
+    ).start()
+
+
+def install_signal_handler():
+    """Reload in the background when RELOAD_SIGNAL arrives.
+
+    Must be called from the main thread.
+    """
+    signal.signal(RELOAD_SIGNAL, _on_reload_signal)
@@ -0,0 +1,352 @@
+"""Query evaluation over docid-sorted postings arrays."""
+
+import heapq
+from array import array
+from bisect import bisect_left
+from index.segment import BlockColumn
+
+
+def gallop(docids, target, lo=0):
+    """Return the first index >= lo whose docid is >= target.
+
+    Exponential search from lo, then a binary search inside the last step, so
+    skipping ahead costs O(log distance) instead of O(log len(docids)).
+    Compressed postings seek with their skip pointers instead.
+    """
+    if isinstance(docids, BlockColumn):
+        return docids.seek(target, lo)
+    step = 1
+    hi = lo
+    while hi < len(docids) and docids[hi] < target:
+        lo = hi + 1
+        hi = lo + step
+        step *= 2
+    return bisect_left(docids, target, lo, min(hi, len(docids)))
+
+
+def intersect(lists, accept=None):
+    """Yield (docid, positions) for every docid present in all lists.
+
+    lists are docid-sorted sequences and positions[j] is the index of docid
+    in lists[j].  The rarest list drives the walk and the others are
+    galloped forward, so no list is ever copied or fully scanned.
+
+    If given, accept(docid, j, i) is called with the driving list j and
+    index i before any other list is probed; returning False skips docid.
+    """
+    order = sorted(range(len(lists)), key=lambda j: len(lists[j]))
+    driver_j, others = order[0], order[1:]
+    driver = lists[driver_j]
+    cursors = [0] * len(lists)
+    positions = [0] * len(lists)
+
+    i = 0
+    while i < len(driver):
+        docid = driver[i]
+        if accept is not None and not accept(docid, driver_j, i):
+            i += 1
+            continue
+        for j in others:
+            docids = lists[j]
+            k = gallop(docids, docid, cursors[j])
+            if k == len(docids):
+                return  # one list is exhausted, no more matches
+            cursors[j] = k
+            if docids[k] != docid:
+                # skip the driver ahead to the next possible match
+                i = gallop(driver, docids[k], i + 1)
+                break
+            positions[j] = k
+        else:
+            positions[driver_j] = i
+            yield docid, tuple(positions)
+            i += 1
+
+
+def term_score(plist, i, w_q):
+    """Return the tf-idf contribution of posting i, weighted by w_q."""
+    # precomputed normalized document weight times normalized query weight
+    return plist.weights[i] * w_q
+
+
+def doc_score(lists, positions, weight, pr_score):
+    """Return the blended score of the postings at positions in lists."""
+    tfidf_sim = 0.0
+    for (plist, w_q), i in zip(lists, positions):
+        tfidf_sim += term_score(plist, i, w_q)
+
+    # incorporate PageRank
+    return (1.0 - weight) * tfidf_sim + weight * pr_score
+
+
+def score_conjunctive(lists, weight, pagerank):
+    """Yield (docid, score) for every doc containing all query terms.
+
+    lists is [(PostingList, w_q)] in query term order and pagerank is
+    indexed by doc ordinal.
+    """
+    for docid, positions in intersect([plist.docids for plist, _ in lists]):
+        yield docid, doc_score(
+            lists, positions, weight, pagerank[docid]
+        )
+
+
+def tfidf_sims(lists):
+    """Return (docids, sims): the tf-idf similarity of every AND match.
+
+    The similarities don't depend on the PageRank weight, so they can be
+    cached and re-blended with blend() for any weight.
+    """
+    docids, sims = array("I"), array("d")
+    for docid, positions in intersect([plist.docids for plist, _ in lists]):
+        tfidf_sim = 0.0
+        for (plist, w_q), i in zip(lists, positions):
+            tfidf_sim += term_score(plist, i, w_q)
+        docids.append(docid)
+        sims.append(tfidf_sim)
+    return docids, sims
+
+
+def blend(docids, sims, weight, pagerank, k=None):
+    """Return the k best (docid, score) of precomputed tf-idf sims.
+
+    Scores are blended exactly as doc_score() does, so the hits match
+    top_k(score_conjunctive(...), k).
+    """
+    return top_k((
+        (docid, (1.0 - weight) * tfidf_sim + weight * pagerank[docid])
+        for docid, tfidf_sim in zip(docids, sims)
+    ), k)
+
+
+def score_conjunctive_top_k(lists, weight, pagerank, max_pagerank, k):
+    """Return the same hits as top_k(score_conjunctive(...), k), pruned.
+
+    MaxScore-style dynamic pruning: each term's contribution is bounded by
+    its PostingList.max_weight * w_q, and a document's PageRank is known
+    before its postings are probed.  Once k hits are held, a document whose
+    bound cannot beat the worst of them is skipped without galloping the
+    other lists, and the walk stops when no document can.
+
+    Bounds are summed in the same order and with the same operations as the
+    real score, and float rounding is monotonic, so they never undercut it
+    and the result is identical to the exhaustive scorer.  Documents arrive
+    in increasing docid order, so a tie never displaces a held hit.
+    """
+    bounds = [plist.max_weight * w_q for plist, w_q in lists]
+    heap = []  # (score, -docid), worst held hit at heap[0]
+
+    def bound(sim_terms, pr_score):
+        tfidf_sim = 0.0
+        for term_bound in sim_terms:
+            tfidf_sim += term_bound
+        return (1.0 - weight) * tfidf_sim + weight * pr_score
+
+    def accept(docid, j, i):
+        if len(heap) < k:
+            return True
+        plist, w_q = lists[j]
+        sim_terms = list(bounds)
+        sim_terms[j] = term_score(plist, i, w_q)
+        return bound(sim_terms, pagerank[docid]) > heap[0][0]
+
+    docids = [plist.docids for plist, _ in lists]
+    for docid, positions in intersect(docids, accept):
+        hit = (
+            doc_score(lists, positions, weight, pagerank[docid]),
+            -docid,
+        )
+
+        if len(heap) < k:
+            heapq.heappush(heap, hit)
+        elif hit > heap[0]:
+            heapq.heapreplace(heap, hit)
+        else:
+            continue
+
+        # no later document can beat the current top k
+        if len(heap) == k and bound(bounds, max_pagerank) <= heap[0][0]:
+            break
+
+    return [(-neg_docid, score) for score, neg_docid in sorted(heap)[::-1]]
+
+
+def _accumulate(accumulators, plist, w_q):
+    """Add every posting's contribution to accumulators {docid: sim}."""
+    get = accumulators.get
+    for docid, doc_weight in zip(plist.docids, plist.weights):
+        accumulators[docid] = get(docid, 0.0) + doc_weight * w_q
+
+
+def disjunctive_sims(lists):
+    """Return (docids, sims): the tf-idf similarity of every OR match.
+
+    Term-at-a-time accumulation: each document's contributions are added in
+    query term order, the order doc_score() uses.  Like tfidf_sims(), the
+    result can be re-blended with blend() for any weight.
+    """
+    accumulators = {}
+    for plist, w_q in lists:
+        _accumulate(accumulators, plist, w_q)
+
+    docids = array("I", sorted(accumulators))
+    return docids, array("d", map(accumulators.__getitem__, docids))
+
+
+# Relative margin on partial tf-idf sums.  Pruning adds contributions in
+# bound order rather than query term order, which can round a few ulps away
+# from the real similarity; the margin keeps bounds on the safe side.
+BOUND_SLACK = 1.0 + 1e-9
+
+
+def _exact_sims(lists, candidates):
+    """Return the tf-idf sims of docid-sorted candidates, in term order.
+
+    Each list is probed for the candidates only: galloping when there are
+    few of them, else by walking the list against a set.
+    """
+    sims = dict.fromkeys(candidates, 0.0)
+    for plist, w_q in lists:
+        docids, weights = plist.docids, plist.weights
+        if len(candidates) * 8 < len(docids):
+            i = 0
+            for docid in candidates:
+                i = gallop(docids, docid, i)
+                if i == len(docids):
+                    break
+                if docids[i] == docid:
+                    sims[docid] += weights[i] * w_q
+        else:
+            for docid, doc_weight in zip(docids, weights):
+                if docid in sims:
+                    sims[docid] += doc_weight * w_q
+    return array("d", sims.values())
+
+
+def _threshold(accumulators, k, weight, pagerank):
+    """Return the k-th best lower bound on accumulated scores, or None.
+
+    accumulators holds partial tf-idf sums {docid: sim}, which the rest of
+    the terms can only increase.  None if fewer than k documents are held.
+    """
+    if len(accumulators) < k:
+        return None
+    return heapq.nlargest(k, (
+        (1.0 - weight) * (partial / BOUND_SLACK) + weight * pagerank[docid]
+        for docid, partial in accumulators.items()
+    ))[-1]
+
+
+def score_disjunctive_top_k(lists, weight, pagerank, max_pagerank, k):
+    """Return the k best OR hits, like blend(*disjunctive_sims(lists)...).
+
+    Term-at-a-time MaxScore: terms are accumulated highest bound
+    (PostingList.max_weight * w_q) first, so rare terms come before common
+    ones.  Once the bounds of the remaining terms plus the max PageRank
+    can't reach the k-th best lower bound held, no new document can make
+    the top k and the common terms' postings are no longer walked.  The
+    candidates that can still make it are then scored exactly, in query
+    term order, by probing each list for them alone.
+    """
+    order = sorted(lists, key=lambda item: -item[0].max_weight * item[1])
+
+    # remaining[i]: bound on what terms order[i:] add to a similarity
+    remaining = [0.0] * (len(order) + 1)
+    for i in range(len(order) - 1, -1, -1):
+        remaining[i] = remaining[i + 1] + order[i][0].max_weight * order[i][1]
+
+    def blended(tfidf_sim, pr_score):
+        return (1.0 - weight) * tfidf_sim + weight * pr_score
+
+    accumulators = {}
+    theta = None
+    for stop, (plist, w_q) in enumerate(order):
+        if theta is not None and blended(
+                remaining[stop] * BOUND_SLACK, max_pagerank) < theta:
+            break
+        _accumulate(accumulators, plist, w_q)
+        theta = _threshold(accumulators, k, weight, pagerank)
+    else:
+        stop = len(order)
+
+    # Only documents whose upper bound reaches theta can be in the top k
+    candidates = array("I", sorted(
+        docid for docid, partial in accumulators.items()
+        if theta is None or blended(
+            (partial + remaining[stop]) * BOUND_SLACK, pagerank[docid]
+        ) >= theta
+    ))
+    return blend(candidates, _exact_sims(lists, candidates), weight,
+                 pagerank, k)
+
+
+def _phrase_at(phrase, indexes):
+    """Return True if phrase occurs in the doc at indexes of its postings.
+
+    Each term's positions, shifted back by its offset, are candidate start
+    positions of the phrase; it occurs if some start is common to all terms.
+    """
+    starts = None
+    for (plist, offset), i in zip(phrase, indexes):
+        if plist.positions is None:
+            return True  # built without positions, any doc with the terms
+        found = {position - offset for position in plist.positions[i]}
+        starts = found if starts is None else starts & found
+        if not starts:
+            return False
+    return True
+
+
+def phrase_docids(phrases):
+    """Return the sorted docids containing every phrase, as array("I").
+
+    Each phrase is [(PostingList, offset)], offset being the term's distance
+    from the phrase's first term.  Documents with all of a phrase's terms
+    are found by intersect(), and only their positions are decoded.
+    """
+    matches = None
+    for phrase in phrases:
+        lists = [plist.docids for plist, _ in phrase]
+        if matches is not None:
+            lists.append(matches)
+        matches = array("I", (
+            docid for docid, indexes in intersect(lists)
+            if _phrase_at(phrase, indexes)
+        ))
+    return matches
+
+
+def candidate_sims(lists, candidates, require_all):
+    """Return (docids, sims) of the matches among docid-sorted candidates.
+
+    With require_all (AND) a candidate must contain every term of lists,
+    otherwise (OR) every candidate must already contain one of them.  Sims
+    are summed in query term order, as tfidf_sims() and disjunctive_sims()
+    do, so blend() ranks the candidates exactly as a full query would.
+    """
+    if not require_all:
+        return candidates, _exact_sims(lists, candidates)
+
+    docids, sims = array("I"), array("d")
+    for docid, indexes in intersect(
+            [plist.docids for plist, _ in lists] + [candidates]):
+        tfidf_sim = 0.0
+        for (plist, w_q), i in zip(lists, indexes):
+            tfidf_sim += term_score(plist, i, w_q)
+        docids.append(docid)
+        sims.append(tfidf_sim)
+    return docids, sims
+
+
+def top_k(scored, k=None):
+    """Return the k best (docid, score) pairs, best first.
+
+    Results are ordered by score descending with docid as the tie-break.  A
+    bounded heap keeps only k pairs in memory; k=None sorts everything.
+    """
+    def rank(hit):
+        return -hit[1], hit[0]
+
+    if k is None:
+        return sorted(scored, key=rank)
+    return heapq.nsmallest(k, scored, key=rank)
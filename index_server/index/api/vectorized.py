@@ -0,0 +1,134 @@
+"""NumPy-vectorized query evaluation, used when INDEX_SCORER is "numpy".
+
+Postings arrays are wrapped with np.frombuffer, which shares memory with
+the array.array or mmap'd memoryview instead of copying it.  Compressed
+docids are decoded in bulk, as the running sum of their gaps, and derived
+weights are computed from all tfs and norms at once.  Every
+elementwise operation mirrors the pure-Python scorer in retrieval.py in the
+same order, so the scores are bit-for-bit identical.
+"""
+
+from index.segment import BlockColumn
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, fall back to the Python scorer
+    np = None
+
+
+def available():
+    """Return True if NumPy is installed."""
+    return np is not None
+
+
+def _as_arrays(plist):
+    """Return NumPy views of a PostingList's docids and weights."""
+    if not isinstance(plist.docids, BlockColumn):
+        docids = np.frombuffer(plist.docids, dtype=np.uint32)
+        return docids, np.frombuffer(plist.weights, dtype=np.float64)
+
+    # Decode compressed blocks in bulk: docids are the gaps' running sum
+    gaps, tfs = zip(*plist.docids.packed())
+    docids = np.cumsum(_concatenate(gaps), dtype=np.uint32)
+    if not isinstance(plist.weights, BlockColumn):
+        return docids, np.frombuffer(plist.weights, dtype=np.float64)
+
+    # Derived weights, (tf * idf) / norm as in segment.doc_weights()
+    norms = np.frombuffer(plist.norms.values, dtype=np.float64)[docids]
+    return docids, np.divide(
+        _concatenate(tfs) * plist.idf, norms,
+        out=np.zeros(len(norms)), where=norms != 0.0,
+    )
+
+
+def _concatenate(packed):
+    """Return one NumPy array of the values of packed array.arrays."""
+    return np.concatenate([
+        np.frombuffer(values, dtype=values.typecode) for values in packed
+    ])
+
+
+def _intersect(arrays):
+    """Return (docids, positions) of docids present in all arrays.
+
+    The rarest list supplies the candidates, which are then located in each
+    other list with a vectorized binary search.
+    """
+    order = sorted(range(len(arrays)), key=lambda j: len(arrays[j][0]))
+    candidates = arrays[order[0]][0]
+    positions = {order[0]: np.arange(len(candidates))}
+
+    for j in order[1:]:
+        docids = arrays[j][0]
+        pos = np.searchsorted(docids, candidates)
+        found = pos < len(docids)
+        found[found] = docids[pos[found]] == candidates[found]
+        candidates = candidates[found]
+        positions = {jj: p[found] for jj, p in positions.items()}
+        positions[j] = pos[found]
+
+    return candidates, [positions[j] for j in range(len(arrays))]
+
+
+def _tfidf_sim(lists, arrays, positions):
+    """Return the tf-idf similarity of every candidate, term by term."""
+    tfidf_sim = np.zeros(len(positions[0]))
+    for (_, w_q), (_, weights), pos in zip(lists, arrays, positions):
+        tfidf_sim += weights[pos] * w_q
+    return tfidf_sim
+
+
+def _top_k(candidates, scores, k):
+    """Return the k best (docid, score), score descending then docid."""
+    # Partition out the top k, keeping every hit tied with the k-th score
+    # so the docid tie-break matches the exhaustive sort.
+    if k is not None and k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+        keep = np.flatnonzero(scores >= scores[top].min())
+        candidates, scores = candidates[keep], scores[keep]
+
+    order = np.lexsort((candidates, -scores))[:k]
+    return list(zip(candidates[order].tolist(), scores[order].tolist()))
+
+
+def tfidf_sims(lists):
+    """Return (docids, sims) arrays of every AND match's tf-idf similarity.
+
+    Like retrieval.tfidf_sims, the result can be re-blended for any weight.
+    """
+    arrays = [_as_arrays(plist) for plist, _ in lists]
+    candidates, positions = _intersect(arrays)
+    return candidates, _tfidf_sim(lists, arrays, positions)
+
+
+def blend(docids, sims, weight, pagerank, k=None):
+    """Return the k best (docid, score) of precomputed tf-idf sims."""
+    if len(docids) == 0:
+        return []
+    pr_score = np.frombuffer(pagerank, dtype=np.float64)[docids]
+    scores = (1.0 - weight) * sims + weight * pr_score
+    return _top_k(docids, scores, k)
+
+
+def disjunctive_sims(lists):
+    """Return (docids, sims) arrays of every OR match's tf-idf similarity.
+
+    Contributions are concatenated in query term order and summed per docid
+    with np.bincount, which adds them in that order, like
+    retrieval.disjunctive_sims.
+    """
+    arrays = [_as_arrays(plist) for plist, _ in lists]
+    candidates, inverse = np.unique(
+        np.concatenate([docids for docids, _ in arrays]), return_inverse=True
+    )
+    contributions = np.concatenate([
+        weights * w_q for (_, w_q), (_, weights) in zip(lists, arrays)
+    ])
+    return candidates, np.bincount(
+        inverse.ravel(), weights=contributions, minlength=len(candidates)
+    )
+
+
+def score_disjunctive_top_k(lists, weight, pagerank, k=None):
+    """Return the k best (docid, score) for an OR query, best first."""
+    return blend(*disjunctive_sims(lists), weight, pagerank, k)
@@ -0,0 +1,27 @@
+"""gunicorn settings for the Index server, used by bin/index."""
+
+from index import app
+from index.api import reload as segment_reload
+
+
+def post_worker_init(worker):
+    """Reload the segment on RELOAD_SIGNAL in every worker.
+
+    gunicorn resets signal handlers in each forked worker, so the handler
+    is installed again here.  A worker respawned after a reload forks from
+    a master that still holds the old segment, so it reloads right away.
+
+    Each worker reloads on its own: a text segment is then read into every
+    worker's private memory, no longer shared copy-on-write with the master.
+    Binary segments stay shared through the page cache.  POST /api/v1/reload/
+    signals every worker of the master, which INDEX_MASTER_PID records.
+
+    Until this hook runs, gunicorn leaves RELOAD_SIGNAL at its default
+    action, which kills the worker.  The master then forks a new one, which
+    finds the segment stale and reloads it.
+    """
+    app.config["INDEX_MASTER_PID"] = worker.ppid
+    segment_reload.install_signal_handler()
+    if segment_reload.stale():
+        worker.log.info("Segment changed since startup, reloading")
+        segment_reload.start_reload()
@@ -0,0 +1,53 @@
+"""
+Per-process memory accounting from /proc (Linux only).
+
+Used to check that forked Index server workers share the loaded index
+instead of each holding a private copy.  Like segment.py, this module only
+depends on the standard library so bin/indexmem can use it without loading
+an index.
+"""
+
+from pathlib import Path
+
+PROC = Path("/proc")
+
+# Fields of /proc/<pid>/smaps_rollup, all in kB
+SMAPS_FIELDS = (
+    "Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean",
+    "Private_Dirty",
+)
+
+
+def smaps_rollup(pid="self"):
+    """Return {field: kB} for SMAPS_FIELDS of pid, or {} if unavailable.
+
+    Private is Private_Clean + Private_Dirty: the memory only this process
+    uses.  Pss splits shared pages evenly among the processes sharing them.
+    """
+    try:
+        text = (PROC/str(pid)/"smaps_rollup").read_text(encoding="utf-8")
+    except OSError:
+        return {}
+
+    usage = {}
+    for line in text.splitlines():
+        field, _, value = line.partition(":")
+        if field in SMAPS_FIELDS:
+            usage[field] = int(value.split()[0])
+    if usage:
+        usage["Private"] = usage.get("Private_Clean", 0) + \
+            usage.get("Private_Dirty", 0)
+    return usage
+
+
+def children(pid):
+    """Return the pids of pid's child processes."""
+    pids = []
+    for path in (PROC/str(pid)/"task").glob("*/children"):
+        try:
+            pids.extend(
+                int(p) for p in path.read_text(encoding="utf-8").split()
+            )
+        except OSError:
+            continue
+    return sorted(pids)
@@ -0,0 +1,704 @@
+"""
+Binary inverted index segment format.
+
+A binary segment holds the same data as a text segment
+(term idf docid tf norm [docid tf norm]...) in a layout that the Index
+server can mmap and read lazily, so startup does not depend on segment size.
+Both formats load into PostingList tuples of docid-sorted parallel arrays,
+where docids are dense ordinals 0..n-1 into the segment's doc table of
+external docids.  Ordinals are assigned in external docid order, so sorting
+by ordinal and by external docid agree.
+
+Text segments may start with a header naming the per-posting fields, e.g.
+"#fields docid tf norm weight" when the pipeline also emits the normalized
+document weight (tf * idf) / norm.  Without a header the fields are
+"docid tf norm", and the weights are computed while loading.  A trailing
+"positions" field holds the term's positions in the document for phrase
+queries, delta-coded and comma-separated: "3,14,23" is positions 3, 17, 40.
+
+Binary layout (all integers and floats little-endian):
+
+    header      magic, number of terms, number of docs, flags, section
+                offsets
+    postings    per term: weight f64[n] unless derived, then either
+                compressed: last ordinal u32[b] and end offset u32[b] of
+                each of the b blocks and the block bytes, or plain (flag
+                PLAIN_POSTINGS): ordinal u32[n] and tf u32[n]; padded to 8
+                bytes, then if the segment has positions: position bounds
+                u32[n + 1] and position bytes, padded to 8 bytes
+    strings     UTF-8 term bytes, concatenated
+    terms       one fixed-size entry per term, sorted by term bytes:
+                string offset, idf, max weight, weights offset (0 if
+                derived), postings offset, positions offset (0 without
+                positions), n, string length
+    docs        doc table: external docid u32 of each ordinal, sorted
+    norms       norm f64 of each ordinal
+
+By default ordinals and tfs are compressed in blocks of BLOCK_SIZE
+postings.  A block stores the gaps between its ordinals (the first one from
+the previous block's last ordinal), then its tfs, each packed as u8, u16 or
+u32, whichever is the narrowest that fits, after a byte giving that width.
+The last ordinal of every block doubles as a skip pointer: a lookup binary
+searches them and decodes only the block holding its target.  A document's
+norm is the same in all of its postings, so it is stored once per document.
+
+A compressed term's weights are not stored when they are exactly
+(tf * idf) / norm, as the pipeline computes them; they are derived from the
+tfs and norms as blocks are decoded.  Plain segments store f64 weights and
+u32 ordinals and tfs that scoring reads straight from the mmap: larger, but
+faster to query.
+
+The max weight of a term is the largest weight in its postings, an upper
+bound used for query pruning.  Positions are delta-coded varints, see
+encode_positions(), and only decoded when a phrase query asks for them.
+
+This module only depends on the standard library so the converter can run
+without importing (and therefore loading) the index package.
+"""
+
+import bisect
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+from itertools import accumulate, chain
+from operator import truediv
+from typing import NamedTuple, Optional
+
+
+# The last two magic bytes are the format version
+MAGIC_PREFIX = b"IDXSEG"
+MAGIC = MAGIC_PREFIX + b"07"
+
+# magic, num_terms, num_docs, flags, postings_offset, strings_offset,
+# terms_offset, docs_offset, norms_offset.  Padded to keep the postings
+# 8-byte aligned.
+HEADER = struct.Struct("<8sIII4xQQQQQ")
+
+# Header flag: postings are plain arrays instead of compressed blocks
+PLAIN_POSTINGS = 1
+
+# string_offset, idf, max_weight, weights_offset, postings_offset,
+# positions_offset, num_postings, string_length
+TERM_ENTRY = struct.Struct("<QddQQQII")
+
+# Per-posting fields of a text segment, and the header that overrides them.
+# Either may be followed by POSITIONS_FIELD.
+TEXT_FIELDS = ("docid", "tf", "norm")
+WEIGHTED_TEXT_FIELDS = ("docid", "tf", "norm", "weight")
+POSITIONS_FIELD = "positions"
+FIELDS_HEADER = "#fields"
+
+# Postings per compressed block, and the array typecode of each packed width
+BLOCK_SIZE = 128
+PACKED_TYPECODES = {1: "B", 2: "H", 4: "I"}
+
+
+def encode_varints(values, out):
+    """Append each non-negative int of values to the bytearray out.
+
+    Variable-byte coding: 7 bits per byte, low bits first, with the high bit
+    set on every byte but the last, so small numbers take one byte.
+    """
+    for value in values:
+        while value >= 0x80:
+            out.append(value & 0x7F | 0x80)
+            value >>= 7
+        out.append(value)
+
+
+def decode_varints(data):
+    """Return the ints encode_varints() wrote to data, as a list."""
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+    return values
+
+
+class Positions:
+    """Each posting's positions of a term in its document, decoded lazily.
+
+    data holds the positions of all postings back to back as varint-coded
+    gaps (first position, then the distance to each next one), and posting
+    i's bytes are data[bounds[i]:bounds[i + 1]].  Indexing decodes a single
+    posting, so queries that don't need positions never touch them.
+    """
+
+    def __init__(self, bounds, data):
+        """Wrap bounds u32[n + 1] and the varint bytes they index."""
+        self.bounds = bounds
+        self.data = data
+
+    def __len__(self):
+        """Return the number of postings."""
+        return len(self.bounds) - 1
+
+    def __getitem__(self, i):
+        """Return posting i's positions in increasing order."""
+        gaps = decode_varints(self.data[self.bounds[i]:self.bounds[i + 1]])
+        return array("I", accumulate(gaps))
+
+
+def encode_positions(gap_lists):
+    """Return Positions for each posting's gaps, e.g. [[3, 14, 23], [0]]."""
+    bounds, data = array("I", [0]), bytearray()
+    for gaps in gap_lists:
+        encode_varints(gaps, data)
+        bounds.append(len(data))
+    return Positions(bounds, bytes(data))
+
+
+class PostingList(NamedTuple):
+    """One term's idf and its postings as parallel arrays sorted by docid.
+
+    The arrays are array.array for text segments and zero-copy memoryviews
+    into the mmap for binary segments; both index and iterate the same way.
+    weights[i] is the normalized document weight (tfs[i] * idf) / norms[i],
+    so scoring a posting is a single multiply-add.  positions is None if
+    the segment was built without them.
+    """
+
+    idf: float
+    docids: Sequence[int]
+    tfs: Sequence[int]
+    norms: Sequence[float]
+    weights: Sequence[float]
+    max_weight: float
+    positions: Optional[Positions] = None
+
+
+def doc_weights(idf, tfs, norms):
+    """Return each posting's (tf * idf) / norm, 0.0 for a zero norm."""
+    norms = list(norms)
+    try:
+        # Fast path, in C
+        return array("d", map(truediv, map(idf.__rmul__, tfs), norms))
+    except ZeroDivisionError:
+        return array("d", (
+            (tf * idf) / norm if norm != 0.0 else 0.0
+            for tf, norm in zip(tfs, norms)
+        ))
+
+
+def is_segment(path):
+    """Return True if path is a binary segment file."""
+    with open(path, "rb") as infile:
+        return infile.read(len(MAGIC_PREFIX)) == MAGIC_PREFIX
+
+
+def parse_fields_header(line):
+    """Return the posting fields named by a header line, else None."""
+    parts = line.split()
+    if not parts or parts[0] != FIELDS_HEADER:
+        return None
+    fields = tuple(parts[1:])
+    base = fields[:-1] if fields[-1:] == (POSITIONS_FIELD,) else fields
+    if base not in (TEXT_FIELDS, WEIGHTED_TEXT_FIELDS):
+        raise ValueError(f"Unsupported text segment fields: {line.strip()}")
+    return fields
+
+
+def parse_text_line(line, fields=TEXT_FIELDS):
+    """Parse one text segment line into (term, PostingList)."""
+    parts = line.split()
+    if not parts:
+        return None
+
+    # fields: docid tf norm [weight] in groups of len(fields)
+    step = len(fields)
+    idf = float(parts[1])
+    docids = array("I", map(int, parts[2::step]))
+    tfs = array("I", map(int, parts[3::step]))
+    norms = array("d", map(float, parts[4::step]))
+    if "weight" in fields:
+        weights = array("d", map(float, parts[5::step]))
+    else:
+        weights = doc_weights(idf, tfs, norms)
+    gaps = []
+    if POSITIONS_FIELD in fields:
+        gaps = parts[2 + fields.index(POSITIONS_FIELD)::step]
+
+    # The pipeline emits postings in docid order, but don't rely on it
+    if any(a >= b for a, b in zip(docids, docids[1:])):
+        order = sorted(range(len(docids)), key=docids.__getitem__)
+        docids = array("I", (docids[i] for i in order))
+        tfs = array("I", (tfs[i] for i in order))
+        norms = array("d", (norms[i] for i in order))
+        weights = array("d", (weights[i] for i in order))
+        gaps = [gaps[i] for i in order] if gaps else []
+
+    positions = None
+    if gaps:
+        positions = encode_positions(map(int, g.split(",")) for g in gaps)
+    return parts[0], PostingList(
+        idf, docids, tfs, norms, weights, max(weights, default=0.0), positions
+    )
+
+
+def read_text_segment(path):
+    """Yield (term, PostingList) for every line of a text segment."""
+    fields = TEXT_FIELDS
+    with open(path, "r", encoding="utf-8") as infile:
+        for line in infile:
+            header = parse_fields_header(line)
+            if header is not None:
+                fields = header
+                continue
+            parsed = parse_text_line(line, fields)
+            if parsed is not None:
+                yield parsed
+
+
+def assign_ordinals(docids):
+    """Return (doc table, {external docid: ordinal}) for a set of docids."""
+    doc_table = array("I", sorted(docids))
+    return doc_table, {docid: i for i, docid in enumerate(doc_table)}
+
+
+def to_ordinals(postings, ordinals):
+    """Return postings with external docids replaced by ordinals."""
+    return postings._replace(
+        docids=array("I", map(ordinals.__getitem__, postings.docids))
+    )
+
+
+def load_text_segment(path):
+    """Return ({term: PostingList}, doc table) for a text segment."""
+    inverted_index = dict(read_text_segment(path))
+    doc_table, ordinals = assign_ordinals(
+        {docid for postings in inverted_index.values()
+         for docid in postings.docids}
+    )
+    for term, postings in inverted_index.items():
+        inverted_index[term] = to_ordinals(postings, ordinals)
+    return inverted_index, doc_table
+
+
+def _pack(values):
+    """Return width byte + values packed in the narrowest width that fits."""
+    top = max(values)
+    for width, typecode in PACKED_TYPECODES.items():
+        if top < 1 << 8 * width:
+            packed = array(typecode, values)
+            if sys.byteorder != "little":
+                packed.byteswap()
+            return bytes([width]) + packed.tobytes()
+    raise ValueError(f"Value too large to pack: {top}")
+
+
+def encode_blocks(docids, tfs):
+    """Return (last docids, block end offsets, block bytes) of postings."""
+    last_docids, ends, data = array("I"), array("I"), bytearray()
+    for start in range(0, len(docids), BLOCK_SIZE):
+        block = docids[start:start + BLOCK_SIZE]
+        previous = last_docids[-1] if last_docids else 0
+        data += _pack([block[0] - previous] + [
+            b - a for a, b in zip(block, block[1:])
+        ])
+        data += _pack(tfs[start:start + BLOCK_SIZE])
+        last_docids.append(block[-1])
+        ends.append(len(data))
+    return last_docids, ends, data
+
+
+def _unpack(data, start, count):
+    """Return (array of count values packed at data[start], end offset)."""
+    width = data[start]
+    values = array(PACKED_TYPECODES[width])
+    values.frombytes(data[start + 1:start + 1 + width * count])
+    return values, start + 1 + width * count
+
+
+class _Blocks:
+    """One term's compressed postings, each block decoded on first use."""
+
+    def __init__(self, num, skips, data, weighting):
+        """Wrap the skip table (last docids, end offsets) and block bytes.
+
+        weighting is the term's (idf, doc norms), to derive weights from.
+        """
+        self.num = num
+        self.last_docids, self._ends = skips
+        self._data = data
+        self._weighting = weighting
+        self._decoded = {}
+
+    def unpack(self, b):
+        """Return block b's packed (docid gaps, tfs) arrays, uncached.
+
+        The first gap is from the previous block's last docid, so the
+        running sum of every block's gaps is the docids.
+        """
+        count = min(BLOCK_SIZE, self.num - b * BLOCK_SIZE)
+        start = self._ends[b - 1] if b else 0
+        gaps, start = _unpack(self._data, start, count)
+        tfs, _ = _unpack(self._data, start, count)
+        return gaps, tfs
+
+    def decode(self, b):
+        """Return block b's [docids, tfs, weights or None] arrays."""
+        block = self._decoded.get(b)
+        if block is None:
+            gaps, tfs = self.unpack(b)
+            docids = array("I", accumulate(
+                gaps, initial=self.last_docids[b - 1] if b else 0
+            ))
+            block = self._decoded[b] = [docids[1:], tfs, None]
+        return block
+
+    def column(self, b, field):
+        """Return block b's docids (field 0), tfs (1) or weights (2).
+
+        Weights are derived on first use, the way text segments compute
+        them when loading.
+        """
+        block = self.decode(b)
+        if block[field] is None:
+            idf, norms = self._weighting
+            block[field] = doc_weights(
+                idf, block[1], map(norms.__getitem__, block[0])
+            )
+        return block[field]
+
+    def seek(self, target, lo=0):
+        """Return the first index >= lo whose docid is >= target.
+
+        Blocks whose last docid is smaller are skipped without decoding.
+        """
+        b = bisect.bisect_left(self.last_docids, target, lo // BLOCK_SIZE)
+        if b == len(self.last_docids):
+            return self.num
+        docids = self.decode(b)[0]
+        start = max(lo - b * BLOCK_SIZE, 0)
+        return b * BLOCK_SIZE + bisect.bisect_left(docids, target, start)
+
+
+class BlockColumn(Sequence):
+    """Docids, tfs or weights of compressed postings, block by block.
+
+    Indexing and iteration decode only the blocks they reach.  The docids
+    column also implements seek(), which skips whole blocks by their last
+    docid without decoding them.
+    """
+
+    def __init__(self, blocks, field):
+        """View field 0 (docids), 1 (tfs) or 2 (weights) of blocks."""
+        self._blocks = blocks
+        self._field = field
+
+    def __len__(self):
+        """Return the number of postings."""
+        return self._blocks.num
+
+    def __getitem__(self, i):
+        """Return posting i's value."""
+        if not 0 <= i < self._blocks.num:
+            raise IndexError(i)
+        return self._blocks.column(i // BLOCK_SIZE, self._field)[
+            i % BLOCK_SIZE
+        ]
+
+    def __iter__(self):
+        """Iterate over all values, decoding one block at a time."""
+        return chain.from_iterable(
+            self._blocks.column(b, self._field)
+            for b in range(len(self._blocks.last_docids))
+        )
+
+    def seek(self, target, lo=0):
+        """Return the first index >= lo whose docid is >= target."""
+        return self._blocks.seek(target, lo)
+
+    def packed(self):
+        """Return the packed docid gaps and tfs of each block, undecoded.
+
+        The running sum of the gaps over all blocks is the docids, which
+        bulk decoders (like the NumPy engine) compute far faster than
+        iterating.
+        """
+        return [
+            self._blocks.unpack(b)
+            for b in range(len(self._blocks.last_docids))
+        ]
+
+
+class _DocValues(Sequence):
+    """Per-document values (like norms) looked up by each posting's docid."""
+
+    def __init__(self, values, docids):
+        """Look up values[docids[i]] for posting i."""
+        self.values = values
+        self.docids = docids
+
+    def __len__(self):
+        """Return the number of postings."""
+        return len(self.docids)
+
+    def __getitem__(self, i):
+        """Return the value of posting i's document."""
+        return self.values[self.docids[i]]
+
+    def __iter__(self):
+        """Iterate over the values of all postings' documents."""
+        return map(self.values.__getitem__, self.docids)
+
+
+def _write_postings(outfile, postings, plain, derived):
+    """Write one term's weights unless derived, then its docids and tfs.
+
+    Docids and tfs are plain arrays if plain, else compressed in blocks.
+    Return the offsets of its weights (0 if derived), docids and tfs, and
+    positions (0 if it has none).
+    """
+    num = len(postings.docids)
+    weights_offset = 0
+    if not derived:
+        weights_offset = outfile.tell()
+        outfile.write(struct.pack(f"<{num}d", *postings.weights))
+    offset = outfile.tell()
+    if plain:
+        outfile.write(struct.pack(f"<{num}I", *postings.docids))
+        outfile.write(struct.pack(f"<{num}I", *postings.tfs))
+    else:
+        last_docids, ends, data = encode_blocks(postings.docids, postings.tfs)
+        outfile.write(struct.pack(f"<{len(ends)}I", *last_docids))
+        outfile.write(struct.pack(f"<{len(ends)}I", *ends))
+        outfile.write(data)
+    outfile.write(bytes(-outfile.tell() % 8))
+    if postings.positions is None:
+        return weights_offset, offset, 0
+
+    # Keep the next term's arrays 8-byte aligned
+    positions_offset = outfile.tell()
+    outfile.write(struct.pack(f"<{num + 1}I", *postings.positions.bounds))
+    outfile.write(postings.positions.data)
+    outfile.write(bytes(-outfile.tell() % 8))
+    return weights_offset, offset, positions_offset
+
+
+def _write_terms(outfile, entries):
+    """Write term strings and the sorted term table, return their offsets."""
+    entries.sort()
+    strings_offset = outfile.tell()
+    string_offsets = []
+    for term_bytes, *_ in entries:
+        string_offsets.append(outfile.tell())
+        outfile.write(term_bytes)
+
+    # Keep the term table 8-byte aligned
+    outfile.write(bytes(-outfile.tell() % 8))
+    terms_offset = outfile.tell()
+    for (term_bytes, *entry), string_offset in zip(entries, string_offsets):
+        outfile.write(TERM_ENTRY.pack(
+            string_offset, *entry, len(term_bytes)
+        ))
+    return strings_offset, terms_offset
+
+
+def _write_docs(outfile, doc_table, doc_norms):
+    """Write the doc table and doc norms, return their offsets."""
+    docs_offset = outfile.tell()
+    outfile.write(struct.pack(f"<{len(doc_table)}I", *doc_table))
+    outfile.write(bytes(-outfile.tell() % 8))
+    norms_offset = outfile.tell()
+    outfile.write(struct.pack(
+        f"<{len(doc_table)}d", *map(doc_norms.__getitem__, doc_table)
+    ))
+    return docs_offset, norms_offset
+
+
+def write_segment(text_path, segment_path, plain=False):
+    """Convert a text segment at text_path to a binary segment.
+
+    With plain, postings are stored as plain arrays instead of compressed.
+    """
+    # First pass: number the documents.  The second pass streams postings
+    # straight after the header, so memory use is bounded by the vocabulary
+    # and document count, not by the number of postings.
+    doc_norms = {}
+    for _, postings in read_text_segment(text_path):
+        doc_norms.update(zip(postings.docids, postings.norms))
+    doc_table, ordinals = assign_ordinals(doc_norms)
+    # (term_bytes, idf, max_weight, weights_offset, postings_offset,
+    #  positions_offset, num)
+    entries = []
+
+    with open(segment_path, "wb") as outfile:
+        outfile.write(bytes(HEADER.size))
+        postings_offset = outfile.tell()
+
+        for term, postings in read_text_segment(text_path):
+            # Compressed segments derive the weights when loading if they
+            # come out the same, which they do for pipeline output
+            derived = not plain and postings.weights == doc_weights(
+                postings.idf, postings.tfs,
+                map(doc_norms.__getitem__, postings.docids),
+            )
+            offsets = _write_postings(
+                outfile, to_ordinals(postings, ordinals), plain, derived
+            )
+            entries.append((
+                term.encode("utf-8"), postings.idf, postings.max_weight,
+                *offsets, len(postings.docids),
+            ))
+
+        # strings, terms, docs and norms offsets
+        offsets = (
+            *_write_terms(outfile, entries),
+            *_write_docs(outfile, doc_table, doc_norms),
+        )
+
+        outfile.seek(0)
+        outfile.write(HEADER.pack(
+            MAGIC, len(entries), len(doc_table),
+            PLAIN_POSTINGS if plain else 0, postings_offset, *offsets
+        ))
+
+
+class _TermKeys:
+    """Sequence view of the sorted term table, used for binary search."""
+
+    def __init__(self, segment):
+        self._segment = segment
+
+    def __len__(self):
+        return len(self._segment)
+
+    def __getitem__(self, i):
+        return self._segment.term_bytes(i)
+
+
+class Segment(Mapping):
+    """Read-only, mmap-backed view of a binary segment.
+
+    Maps term -> PostingList whose docids, tfs and derived weights are
+    BlockColumns decoding the mmap'd blocks as they are read, so only the
+    pages touched by queries become resident.  Stored weights, and all the
+    arrays of plain segments, are memoryviews straight into the mmap.
+    doc_table maps ordinals back to external docids.  The postings are
+    stored little-endian, so the zero-copy views require a little-endian
+    host.
+    """
+
+    def __init__(self, path):
+        """Open and mmap the segment at path."""
+        self.path = Path(path)
+        with open(self.path, "rb") as infile:
+            self._mm = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self._num_terms, num_docs, _, _, _, self._terms_offset,
+         docs_offset, norms_offset) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(
+                f"Unsupported index segment format {magic!r}: {self.path}, "
+                "rebuild it with bin/indexconvert"
+            )
+        if sys.byteorder != "little":
+            raise ValueError("Binary segments require a little-endian host")
+        self._view = memoryview(self._mm)
+        self.doc_table = self._view[
+            docs_offset:docs_offset + 4 * num_docs
+        ].cast("I")
+        self.doc_norms = self._view[
+            norms_offset:norms_offset + 8 * num_docs
+        ].cast("d")
+
+    @property
+    def plain(self):
+        """Return True if the postings are plain arrays, not compressed."""
+        return bool(HEADER.unpack_from(self._mm, 0)[3] & PLAIN_POSTINGS)
+
+    def _entry(self, i):
+        """Unpack term table entry i."""
+        return TERM_ENTRY.unpack_from(
+            self._mm, self._terms_offset + i * TERM_ENTRY.size
+        )
+
+    def term_bytes(self, i):
+        """Return the UTF-8 bytes of term i."""
+        string_offset, *_, length = self._entry(i)
+        return self._mm[string_offset:string_offset + length]
+
+    def _find(self, term):
+        """Return the term table index of term, or -1."""
+        key = term.encode("utf-8")
+        i = bisect.bisect_left(_TermKeys(self), key)
+        if i < self._num_terms and self.term_bytes(i) == key:
+            return i
+        return -1
+
+    def __len__(self):
+        """Return the number of terms."""
+        return self._num_terms
+
+    def __iter__(self):
+        """Iterate over terms in sorted order."""
+        for i in range(self._num_terms):
+            yield self.term_bytes(i).decode("utf-8")
+
+    def __contains__(self, term):
+        """Return True if term has a postings list in this segment."""
+        return isinstance(term, str) and self._find(term) >= 0
+
+    def __getitem__(self, term):
+        """Return the PostingList for term."""
+        i = self._find(term) if isinstance(term, str) else -1
+        if i < 0:
+            raise KeyError(term)
+        _, idf, max_weight, weights, offset, positions, num, _ = \
+            self._entry(i)
+        if self.plain:
+            docids = self._view[offset:offset + 4 * num].cast("I")
+            tfs = self._view[offset + 4 * num:offset + 8 * num].cast("I")
+            blocks = None
+        else:
+            docids, tfs, blocks = self._blocks(idf, offset, num)
+        if weights:
+            weights = self._view[weights:weights + 8 * num].cast("d")
+        elif num <= BLOCK_SIZE:
+            weights = doc_weights(idf, tfs, _DocValues(self.doc_norms, docids))
+        else:
+            weights = BlockColumn(blocks, 2)
+        return PostingList(
+            idf,
+            docids,
+            tfs,
+            _DocValues(self.doc_norms, docids),
+            weights,
+            max_weight,
+            self._positions(positions, num) if positions else None,
+        )
+
+    def _blocks(self, idf, offset, num):
+        """Return (docids, tfs, _Blocks) of compressed postings at offset."""
+        last_docids = offset
+        ends = last_docids + 4 * -(-num // BLOCK_SIZE)
+        data = ends + (ends - last_docids)
+        blocks = _Blocks(
+            num,
+            (self._view[last_docids:ends].cast("I"),
+             self._view[ends:data].cast("I")),
+            self._view[data:],
+            (idf, self.doc_norms),
+        )
+
+        # Most terms are rare and fit in one block, which would be decoded
+        # on first use anyway.  Plain arrays then index at C speed.
+        if num <= BLOCK_SIZE:
+            docids, tfs, _ = blocks.decode(0)
+            return docids, tfs, blocks
+        return BlockColumn(blocks, 0), BlockColumn(blocks, 1), blocks
+
+    def _positions(self, offset, num):
+        """Return Positions over the mmap, without reading any of it."""
+        data = offset + 4 * (num + 1)
+        return Positions(
+            self._view[offset:data].cast("I"), self._view[data:]
+        )
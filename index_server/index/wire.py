@@ -0,0 +1,34 @@
+"""
+Compact binary encoding of hits API responses.
+
+The Search server asks for it with "Accept: application/x-index-hits";
+everyone else gets the default JSON.  The layout (little-endian) is
+
+    count       u32
+    docids      u32[count], external docids like the segment doc table
+    scores      f64[count]
+
+in rank order.  Encoding is a couple of array copies instead of building
+and serializing one dict per hit, see bin/hitsbench.  Like segment.py, this
+module only depends on the standard library.
+"""
+
+import struct
+import sys
+from array import array
+
+HITS_MEDIA_TYPE = "application/x-index-hits"
+
+COUNT = struct.Struct("<I")
+
+
+def encode_hits(hits):
+    """Return the binary encoding of ranked (docid, score) pairs."""
+    docids = array("I", [docid for docid, _ in hits])
+    scores = array("d", [score for _, score in hits])
+    if sys.byteorder == "big":
+        docids.byteswap()
+        scores.byteswap()
+    return b"".join((
+        COUNT.pack(len(hits)), docids.tobytes(), scores.tobytes()
+    ))
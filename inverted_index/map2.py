@@ -1,10 +1,20 @@
 #!/usr/bin/env python3
 
-"""Map 2: (docid, raw text) -> (term docid, 1) with cleaning + stopwords."""
+"""Map 2: (docid, raw text) -> (term docid, 1) with cleaning + stopwords.
 
+With INDEX_EMIT_POSITIONS=1 in the environment, each pair also carries the
+token's position: its index among the document's cleaned tokens, stopwords
+included, so a phrase like "bank of america" keeps its gap.  The value is
+then "1 position".
+"""
+
+import os
 import sys
 import re
 
+# Optionally record token positions for phrase queries
+EMIT_POSITIONS = os.environ.get("INDEX_EMIT_POSITIONS", "") == "1"
+
 # Load stopwords once at startup
 STOPWORDS = set()
 with open("stopwords.txt", encoding="utf-8") as infile:
@@ -15,7 +25,10 @@ with open("stopwords.txt", encoding="utf-8") as infile:
 
 
 def tokenize_and_filter(text):
-    """Clean text, split into tokens, drop stopwords."""
+    """Clean text, split into tokens, drop stopwords.
+
+    Return (position, token) pairs, positions counting the dropped tokens.
+    """
     # Remove non-alphanumeric characters (but keep spaces)
     # everything except letters, digits, and spaces becomes ""
     text = re.sub(r"[^a-zA-Z0-9 ]+", "", text)
@@ -28,7 +41,10 @@ def tokenize_and_filter(text):
 
     # Drop stopwords and empty tokens
     # return tokens that are not empty + not stopwords
-    return [tok for tok in tokens if tok and tok not in STOPWORDS]
+    return [
+        (position, tok) for position, tok in enumerate(tokens)
+        if tok and tok not in STOPWORDS
+    ]
 
 
 def main():
@@ -55,8 +71,11 @@ def main():
         # Emit one (term docid) pair per occurence with count 1
         # kwy : "term DOCID"
         # value: "1"
-        for term in terms:
-            print(f"{term} {doc_id}\t1")
+        for position, term in terms:
+            if EMIT_POSITIONS:
+                print(f"{term} {doc_id}\t1 {position}")
+            else:
+                print(f"{term} {doc_id}\t1")
 
 
 if __name__ == "__main__":
@@ -7,6 +7,9 @@ Input:
 
 Output:
     segment term IDF docid TF NORM
+
+Token positions after the IDF, if the pipeline records them, are carried
+through at the end.
 """
 
 import sys
@@ -23,19 +26,22 @@ def main():
         term, _, value = line.partition("\t")
         parts = value.split()
 
-        # expect: DOCID TF NORM ID --> these 4 pieces
-        if len(parts) != 4:
+        # expect: DOCID TF NORM ID --> these 4 pieces, then POSITIONS
+        if len(parts) not in (4, 5):
             continue  # malformed line
 
-        docid_str, tf_str, norm_str, idf_str = parts
+        docid_str, tf_str, norm_str, idf_str, *positions = parts
 
         # Segment by docid % 3 --> segemnt index is: 0, 1, 2
         seg = int(docid_str) % 3
 
         # Mapper output:
         # Key: segment
-        # value: "term IDF docid TF NORM"
-        print(f"{seg}\t{term} {idf_str} {docid_str} {tf_str} {norm_str}")
+        # value: "term IDF docid TF NORM [POSITIONS]"
+        print(" ".join([
+            f"{seg}\t{term}", idf_str, docid_str, tf_str, norm_str,
+            *positions,
+        ]))
 
 
 if __name__ == "__main__":
@@ -54,6 +54,10 @@
 
 set -Eeuo pipefail
 
+# Set INDEX_EMIT_WEIGHTS=1 to also emit each posting's normalized weight,
+# and INDEX_EMIT_POSITIONS=1 to record term positions for phrase queries
+# (see map2.py and reduce5.py).  The default output keeps the three-field
+# format.
 PIPELINE_INPUT=crawl
 if [ -n "${1-}" ]; then
   PIPELINE_INPUT="$1"
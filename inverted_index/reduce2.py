@@ -1,5 +1,9 @@
 #!/usr/bin/env python3
-"""Reduce 2: Sum counts to compute term frequency (TF).."""
+"""Reduce 2: Sum counts to compute term frequency (TF)..
+
+If map2.py emitted token positions, they are collected in increasing order
+and follow the TF as one comma-separated field, e.g. "4 3,17,40,41".
+"""
 
 import sys
 import itertools
@@ -12,13 +16,20 @@ def reduce_one_group(key, group):
     Group: all lines like "term docID."
     """
     total = 0
+    positions = []
     for line in group:
-        # Line format: "term DOCID\t1"
+        # Line format: "term DOCID\t1 [POSITION]"
         _, _, value = line.partition('\t')  # _ <- count ; _ <- \t ; value <- 1
-        total += int(value)
-
-    # output format: "term docID\tTF"
-    print(f"{key}\t{total}")
+        count, *position = value.split()
+        total += int(count)
+        positions.extend(map(int, position))
+
+    # output format: "term docID\tTF [POSITIONS]"
+    if positions:
+        positions.sort()
+        print(f"{key}\t{total} {','.join(map(str, positions))}")
+    else:
+        print(f"{key}\t{total}")
 
 
 def keyfunc(line):
@@ -63,6 +63,9 @@ Input (grouped by term):
 
 Output:
     docid term TF IDF
+
+Token positions after the TF, if the pipeline records them, are carried
+through after the IDF.
 """
 
 import sys
@@ -88,7 +91,7 @@ def reduce_one_group(term, group, total_docs):
 
     Group: all lines "term docid TF."
     """
-    postings = []  # list of (docid_str, tf_int)
+    postings = []  # list of (docid_str, tf_int, positions)
 
     for line in group:
         _, _, value = line.partition("\t")  # value = "docid TF"
@@ -96,9 +99,9 @@ def reduce_one_group(term, group, total_docs):
         if not value:
             continue
 
-        # split "DOCID TF"
-        docid_str, tf_str = value.split()
-        postings.append((docid_str, int(tf_str)))
+        # split "DOCID TF [POSITIONS]"
+        docid_str, tf_str, *positions = value.split()
+        postings.append((docid_str, int(tf_str), positions))
 
     if not postings:
         return
@@ -110,8 +113,9 @@ def reduce_one_group(term, group, total_docs):
     idf = math.log10(total_docs / df)
 
     # Emit one line per document containig this term: docid\tterm TF IDF
-    for docid_str, tf in postings:
-        print(f"{docid_str}\t{term} {tf} {idf}")
+    for docid_str, tf, positions in postings:
+        print(" ".join([f"{docid_str}\t{term}", str(tf), str(idf),
+                        *positions]))
 
 
 def main():
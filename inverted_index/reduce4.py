@@ -33,6 +33,9 @@ Input:
 
 Output:
     term docid TF NORM IDF
+
+Token positions after the IDF, if the pipeline records them, are carried
+through at the end.
 """
 
 import sys
@@ -51,7 +54,7 @@ def reduce_one_group(docid_str, group):
 
     Group: all lines 'docid term TF IDF' for this doc.
     """
-    entries = []  # list of (term, TF, IDF)
+    entries = []  # list of (term, TF, IDF, positions)
     sum_sq = 0.0  # this will be the sum of (TF * IDF)^2
 
     for line in group:
@@ -61,16 +64,16 @@ def reduce_one_group(docid_str, group):
             continue
 
         parts = value.split()
-        if len(parts) != 3:
+        if len(parts) not in (3, 4):
             continue  # malformed line so we skip
 
-        term, tf_str, idf_str = parts
+        term, tf_str, idf_str, *positions = parts
         tf = int(tf_str)
         idf = float(idf_str)
 
         weight = tf * idf
         sum_sq += weight * weight  # accumulat the (TF * IDF)^2
-        entries.append((term, tf, idf))
+        entries.append((term, tf, idf, positions))
 
     if not entries:
         return
@@ -79,9 +82,10 @@ def reduce_one_group(docid_str, group):
     norm = math.sqrt(sum_sq)
 
     # Emit one line per term, keyed by term (for next stages)
-    # term\tDOCID TF NORM IDF
-    for term, tf, idf in entries:
-        print(f"{term}\t{docid_str} {tf} {norm} {idf}")
+    # term\tDOCID TF NORM IDF [POSITIONS]
+    for term, tf, idf, positions in entries:
+        print(" ".join([f"{term}\t{docid_str}", str(tf), str(norm), str(idf),
+                        *positions]))
 
 
 def main():
@@ -7,17 +7,65 @@ Input (grouped by segment):
 
 Output (per segment file):
     term idf docid tf norm docid tf norm ...
+
+With INDEX_EMIT_WEIGHTS=1 in the environment, each posting also carries its
+normalized document weight (tf * idf) / norm, and the file starts with a
+header naming the fields:
+    #fields docid tf norm weight
+    term idf docid tf norm weight docid tf norm weight ...
+
+With INDEX_EMIT_POSITIONS=1 (see map2.py), each posting ends with the
+term's positions in the document, delta-coded: the first position, then the
+gap to each next one, e.g. positions 3, 17, 40 are written "3,14,23".  The
+header then ends with "positions".
 """
 
+import os
 import sys
 import itertools
 
+# Optionally precompute each posting's normalized weight for the Index server
+EMIT_WEIGHTS = os.environ.get("INDEX_EMIT_WEIGHTS", "") == "1"
+
+# Optionally keep the token positions recorded by map2.py
+EMIT_POSITIONS = os.environ.get("INDEX_EMIT_POSITIONS", "") == "1"
+
 
 def keyfunc(line):
     """Group by segment index (0, 1, or 2)."""
     return line.partition("\t")[0]
 
 
+def print_fields_header():
+    """Print the header naming the posting fields, unless they're default."""
+    fields = ["docid", "tf", "norm"]
+    if EMIT_WEIGHTS:
+        fields.append("weight")
+    if EMIT_POSITIONS:
+        fields.append("positions")
+    if len(fields) > 3:
+        print(" ".join(["#fields", *fields]))
+
+
+def delta_code(positions_str):
+    """Return comma-separated increasing positions as first, gap, gap..."""
+    positions = [int(p) for p in positions_str.split(",")]
+    gaps = [b - a for a, b in zip(positions, positions[1:])]
+    return ",".join(map(str, positions[:1] + gaps))
+
+
+def format_posting(idf, docid_str, tf, norm, positions_str=None):
+    """Return the output fields for one posting."""
+    fields = [docid_str, str(tf), str(norm)]
+    if EMIT_WEIGHTS:
+        # same expression the Index server scores with
+        weight = (tf * idf) / norm if norm != 0.0 else 0.0
+        fields.append(str(weight))
+    if EMIT_POSITIONS:
+        fields.append(delta_code(positions_str))
+    return fields
+
+
 def reduce_one_segment(group):
     """segment_key: '0', '1', or '2'."""
     terms = {}
@@ -29,10 +77,10 @@ def reduce_one_segment(group):
             continue
 
         parts = value.split()
-        if len(parts) != 5:
+        if len(parts) != (6 if EMIT_POSITIONS else 5):
             continue  # malformed
 
-        term, idf_str, docid_str, tf_str, norm_str = parts
+        term, idf_str, docid_str, tf_str, norm_str = parts[:5]
         idf = float(idf_str)
         tf = int(tf_str)
         norm = float(norm_str)
@@ -49,9 +97,10 @@ def reduce_one_segment(group):
             pass
 
         # remember this posting for the term
-        entry["docs"].append((docid_str, tf, norm))
+        entry["docs"].append((docid_str, tf, norm, *parts[5:]))
 
     # Emit final lines: term idf docid tf norm docid tf norm ...
+    print_fields_header()
     for term in sorted(terms.keys()):
         entry = terms[term]
         idf = entry["idf"]
@@ -63,9 +112,10 @@ def reduce_one_segment(group):
         # start with [term, idf]
         fields = [term, str(idf)]
 
-        # append doc triples: DOCID TF NORM
-        for docid_str, tf, norm in docs:
-            fields.extend([docid_str, str(tf), str(norm)])
+        # append doc triples: DOCID TF NORM [WEIGHT] [POSITIONS]
+        fields.extend(
+            field for doc in docs for field in format_posting(idf, *doc)
+        )
 
         # JOIN everything w/ spaces to match spec format
         print(" ".join(fields))
@@ -1,7 +1,20 @@
 """Thanks for this."""
+import sqlite3
 from flask import Flask
 from .views.views import main
+from . import model
 app = Flask(__name__)
 app.config.from_object("search.config")
 
 app.register_blueprint(main)
+
+# Optionally preload metadata of the most popular documents
+if app.config["SEARCH_DOC_CACHE_WARMUP"] > 0:
+    with app.app_context():
+        try:
+            model.warm_doc_cache(
+                app.config["SEARCH_PAGERANK_PATH"],
+                app.config["SEARCH_DOC_CACHE_WARMUP"],
+            )
+        except (OSError, ValueError, sqlite3.Error) as err:
+            app.logger.warning("Document cache warm-up skipped: %s", err)
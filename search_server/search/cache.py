@@ -0,0 +1,76 @@
+"""Bounded in-memory cache of rendered document metadata."""
+
+import sys
+import threading
+from collections import OrderedDict
+
+
+def record_size(doc):
+    """Return the approximate size in bytes of a metadata dict."""
+    return sys.getsizeof(doc) + sum(
+        sys.getsizeof(key) + sys.getsizeof(value)
+        for key, value in doc.items()
+    )
+
+
+class DocCache:
+    """Thread-safe LRU cache of metadata dicts keyed by docid.
+
+    Records are evicted least recently used first once there are more than
+    max_entries of them or their total size exceeds max_bytes.  A limit of
+    0 disables the cache.
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        """Create an empty cache."""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._entries = OrderedDict()  # docid -> (doc, size)
+        self._lock = threading.Lock()
+
+    def get_many(self, docids):
+        """Return {docid: doc} for the cached docids, counting hits."""
+        found = {}
+        with self._lock:
+            for docid in docids:
+                entry = self._entries.get(docid)
+                if entry is None:
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(docid)
+                self.hits += 1
+                found[docid] = entry[0]
+        return found
+
+    def put(self, doc):
+        """Cache doc, evicting old records to stay within the limits."""
+        size = record_size(doc)
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(doc["docid"], None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[doc["docid"]] = (doc, size)
+            self._bytes += size
+            while (len(self._entries) > self.max_entries
+                   or self._bytes > self.max_bytes):
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def stats(self):
+        """Return the counters, hit rate and current usage as a dict."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
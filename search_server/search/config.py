@@ -1,6 +1,52 @@
 """guys this is so stupid."""
+import os
+
+# Replicas per Index segment started by bin/index (INDEX_REPLICAS).  Replica
+# r of segment s listens on port 9000 + s + 3 * r.
+SEARCH_INDEX_REPLICAS = int(os.getenv("INDEX_REPLICAS", "1"))
+
+# One entry per segment: a hits API URL, or a list of replica URLs serving
+# the same segment
 SEARCH_INDEX_SEGMENT_API_URLS = [
-    "http://localhost:9000/api/v1/hits/",
-    "http://localhost:9001/api/v1/hits/",
-    "http://localhost:9002/api/v1/hits/",
+    [
+        f"http://localhost:{9000 + segment + 3 * replica}/api/v1/hits/"
+        for replica in range(SEARCH_INDEX_REPLICAS)
+    ]
+    for segment in range(3)
 ]
+
+# With INDEX_SINGLE_PROCESS=1, replica r serves every segment on port
+# 9000 + r and merges their hits, so it is asked like a single segment
+if os.getenv("INDEX_SINGLE_PROCESS", "0") == "1":
+    SEARCH_INDEX_SEGMENT_API_URLS = [[
+        f"http://localhost:{9000 + replica}/api/v1/hits/"
+        for replica in range(SEARCH_INDEX_REPLICAS)
+    ]]
+
+# Threads and keep-alive connections per Index replica, shared by all
+# searches
+SEARCH_FANOUT_WORKERS_PER_SEGMENT = 4
+
+# Search results shown per page
+SEARCH_PAGE_SIZE = 10
+
+# Document metadata cache limits, 0 disables it
+SEARCH_DOC_CACHE_ENTRIES = 10000
+SEARCH_DOC_CACHE_BYTES = 16 << 20
+
+# Preload the metadata of this many top-PageRank documents at startup
+SEARCH_DOC_CACHE_WARMUP = 0
+SEARCH_PAGERANK_PATH = "index_server/index/pagerank.out"
+
+# Seconds a search waits for the segments.  Segments that miss the deadline
+# are left out and the page is marked as degraded.
+SEARCH_FANOUT_DEADLINE = 5.0
+
+# Seconds after which a slow segment is also asked on another replica,
+# None to never hedge
+SEARCH_HEDGE_AFTER = 0.2
+
+# Consecutive failures that eject a replica from balancing, and for how
+# many seconds
+SEARCH_EJECT_AFTER = 3
+SEARCH_EJECT_SECONDS = 10.0
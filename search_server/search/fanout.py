@@ -0,0 +1,249 @@
+"""Persistent scatter-gather client for the Index server segments."""
+
+import concurrent.futures
+import random
+import threading
+import time
+from typing import NamedTuple, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from search.wire import ACCEPT, response_hits
+
+
+def replica_urls(urls):
+    """Return a tuple of replica URL tuples, one per segment.
+
+    Each entry of urls is one segment: a hits API URL, or a list of URLs of
+    interchangeable replicas serving the same segment.
+    """
+    return tuple(
+        (entry,) if isinstance(entry, str) else tuple(entry)
+        for entry in urls
+    )
+
+
+class FanOutConfig(NamedTuple):
+    """Tuning knobs of a FanOut client."""
+
+    # Threads and keep-alive connections per replica
+    workers_per_segment: int = 4
+
+    # Seconds a search waits for all segments
+    deadline: float = 5.0
+
+    # Seconds before a slow segment is also asked on another replica
+    hedge_after: Optional[float] = None
+
+    # Consecutive failures that eject a replica, and for how many seconds
+    eject_after: int = 3
+    eject_seconds: float = 10.0
+
+
+class ReplicaSet:
+    """The replicas of one segment, with load and health tracking.
+
+    Replicas are picked by power of two choices: of two random healthy
+    replicas, the one with fewer outstanding requests.  A replica that
+    fails eject_after times in a row is ejected for eject_seconds, then
+    gets another chance.  If every replica is ejected they are all used.
+    """
+
+    def __init__(self, urls, eject_after=3, eject_seconds=10.0):
+        """Track urls, all healthy and idle."""
+        self.urls = tuple(urls)
+        self.ejection = (eject_after, eject_seconds)
+        self._outstanding = dict.fromkeys(self.urls, 0)
+        self._failures = dict.fromkeys(self.urls, 0)
+        self._ejected_until = dict.fromkeys(self.urls, 0.0)
+        self._lock = threading.Lock()
+
+    def healthy(self, url):
+        """Return True unless url is currently ejected."""
+        return self._ejected_until[url] <= time.monotonic()
+
+    def pick(self, exclude=()):
+        """Start a request on the best replica not in exclude, or None."""
+        with self._lock:
+            candidates = [url for url in self.urls if url not in exclude]
+            healthy = [url for url in candidates if self.healthy(url)]
+            candidates = healthy or candidates
+            if not candidates:
+                return None
+            url = min(
+                random.sample(candidates, min(2, len(candidates))),
+                key=self._outstanding.__getitem__,
+            )
+            self._outstanding[url] += 1
+            return url
+
+    def release(self, url):
+        """Drop a request started by pick() that was never sent."""
+        with self._lock:
+            self._outstanding[url] -= 1
+
+    def finish(self, url, success):
+        """Record the outcome of a request started by pick()."""
+        eject_after, eject_seconds = self.ejection
+        with self._lock:
+            self._outstanding[url] -= 1
+            if success:
+                self._failures[url] = 0
+                return
+            self._failures[url] += 1
+            if self._failures[url] >= eject_after:
+                self._ejected_until[url] = time.monotonic() + eject_seconds
+
+    def stats(self):
+        """Return {url: {"outstanding", "failures", "healthy"}}."""
+        with self._lock:
+            return {
+                url: {
+                    "outstanding": self._outstanding[url],
+                    "failures": self._failures[url],
+                    "healthy": self.healthy(url),
+                }
+                for url in self.urls
+            }
+
+
+class FanOut:
+    """Query every Index segment in parallel over keep-alive connections.
+
+    One long-lived thread pool is shared by all searches, and each replica
+    gets its own requests.Session whose connection pool holds up to
+    workers_per_segment connections, so repeated searches reuse both the
+    threads and the TCP connections.  Sessions ask for the compact binary
+    hits format and fall back to JSON.
+
+    A search waits at most deadline seconds for the segments.  A segment
+    that hasn't answered after hedge_after seconds, or whose replica failed,
+    is asked again on another replica and the first answer wins.
+    """
+
+    def __init__(self, urls, config=FanOutConfig()):
+        """Create the pool and one session per replica URL."""
+        self.config = config
+        self.segments = [
+            ReplicaSet(replicas, config.eject_after, config.eject_seconds)
+            for replicas in replica_urls(urls)
+        ]
+        self.sessions = {}
+        for replicas in self.segments:
+            for url in replicas.urls:
+                session = requests.Session()
+                session.headers["Accept"] = ACCEPT
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=config.workers_per_segment,
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self.sessions[url] = session
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=len(self.sessions) * config.workers_per_segment,
+            thread_name_prefix="fanout",
+        )
+
+    def fetch(self, segment, url, params, stop):
+        """Return the hits from one replica, or None if it fails.
+
+        The request may wait in the pool, so its timeout is what is left
+        until the search's monotonic deadline stop when it starts.
+        """
+        timeout = stop - time.monotonic()
+        if timeout <= 0:
+            segment.release(url)
+            return None
+        hits = None
+        try:
+            resp = self.sessions[url].get(url, params=params, timeout=timeout)
+            resp.raise_for_status()
+            hits = response_hits(resp)
+        except (requests.RequestException, ValueError):
+            pass
+        segment.finish(url, hits is not None)
+        return hits
+
+    def cancel(self, pending):
+        """Cancel the fetches in pending {future: (segment index, url)}.
+
+        Fetches that haven't started are dropped from their replica's load;
+        running ones finish in the background and are ignored.
+        """
+        for future, (i, url) in pending.items():
+            if future.cancel():
+                self.segments[i].release(url)
+
+    def get(self, params):
+        """Return (hits per segment in segment order, degraded).
+
+        degraded is True if some segment had no answer by the deadline or
+        every replica failed; its hits are then [].
+        """
+        stop = time.monotonic() + self.config.deadline
+        hedge_at = None
+        if self.config.hedge_after is not None:
+            hedge_at = time.monotonic() + self.config.hedge_after
+        results = [None] * len(self.segments)
+        tried = [set() for _ in self.segments]
+        pending = {}  # future -> (segment index, url)
+
+        def submit(i):
+            url = self.segments[i].pick(exclude=tried[i])
+            if url is None:
+                return
+            tried[i].add(url)
+            pending[self.executor.submit(
+                self.fetch, self.segments[i], url, params, stop
+            )] = (i, url)
+
+        for i in range(len(self.segments)):
+            submit(i)
+
+        while pending and time.monotonic() < stop:
+            wake = stop if hedge_at is None else min(stop, hedge_at)
+            done, _ = concurrent.futures.wait(
+                pending, timeout=max(wake - time.monotonic(), 0),
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            for future in done:
+                i, _ = pending.pop(future)
+                hits = future.result()
+                if results[i] is not None:
+                    continue
+                if hits is not None:
+                    results[i] = hits
+                else:
+                    submit(i)  # fail over to another replica
+
+            # Hedge segments that are still slow, once per search
+            if hedge_at is not None and time.monotonic() >= hedge_at:
+                hedge_at = None
+                for i, hits in enumerate(results):
+                    if hits is None:
+                        submit(i)
+
+            # Answers to segments that already have results don't matter
+            self.cancel({
+                future: task for future, task in pending.items()
+                if results[task[0]] is not None
+            })
+            pending = {
+                future: task for future, task in pending.items()
+                if results[task[0]] is None
+            }
+
+        # Nothing still pending can make it into this search's results
+        self.cancel(pending)
+        degraded = None in results
+        return [hits or [] for hits in results], degraded
+
+    def stats(self):
+        """Return per-segment replica load and health."""
+        return [replicas.stats() for replicas in self.segments]
+
+    def close(self):
+        """Wait for in-flight requests, then stop the pool and sessions."""
+        self.executor.shutdown(wait=True)
+        for session in self.sessions.values():
+            session.close()
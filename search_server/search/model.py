@@ -1 +1,132 @@
-"""Nothing needed here."""
+"""Search server document metadata access."""
+
+import heapq
+import sqlite3
+import threading
+import urllib.parse
+from pathlib import Path
+from flask import current_app
+from search.cache import DocCache
+
+# Per-thread read-only connections, keyed by database path
+LOCAL = threading.local()
+
+# Guards creating the shared DocCache
+DOC_CACHE_LOCK = threading.Lock()
+
+
+def db_path():
+    """Return the absolute path of the configured metadata database."""
+    return Path(
+        current_app.config.get("SEARCH_DB_PATH", "var/search.sqlite3")
+    ).resolve()
+
+
+def get_db():
+    """Return this thread's read-only connection to SEARCH_DB_PATH.
+
+    Connections are opened once per thread and reused by every later
+    search, instead of once per document.
+    """
+    path = db_path()
+    if not hasattr(LOCAL, "connections"):
+        LOCAL.connections = {}
+
+    conn = LOCAL.connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(f"{path.as_uri()}?mode=ro", uri=True)
+        LOCAL.connections[path] = conn
+    return conn
+
+
+def get_doc_cache():
+    """Return the app's shared DocCache for the configured database.
+
+    The cache is rebuilt, empty, if SEARCH_DB_PATH changes.
+    """
+    path = db_path()
+    cached_path, doc_cache = current_app.extensions.get(
+        "search_doc_cache", (None, None)
+    )
+    if cached_path == path:
+        return doc_cache
+
+    with DOC_CACHE_LOCK:
+        cached_path, doc_cache = current_app.extensions.get(
+            "search_doc_cache", (None, None)
+        )
+        if cached_path != path:
+            doc_cache = DocCache(
+                current_app.config.get("SEARCH_DOC_CACHE_ENTRIES", 10000),
+                current_app.config.get("SEARCH_DOC_CACHE_BYTES", 16 << 20),
+            )
+            current_app.extensions["search_doc_cache"] = (path, doc_cache)
+    return doc_cache
+
+
+def doc_info(docid, title="", summary="", url=""):
+    """Return the metadata dict rendered for one search result."""
+    title = title or ""
+    summary = summary or ""
+    url = url or ""
+    return {
+        "docid": docid,
+        "title": title,
+        "summary": summary,
+        "url": url,
+        # Decoded URL text for display in <a class="doc_url">...</a>
+        "url_display": urllib.parse.unquote(url),
+    }
+
+
+def query_documents(docids):
+    """Return {docid: metadata} for docids, read with one query."""
+    if not docids:
+        return {}
+
+    placeholders = ",".join("?" * len(docids))
+    cur = get_db().execute(
+        "SELECT docid, title, summary, url FROM documents "
+        f"WHERE docid IN ({placeholders})",
+        docids,
+    )
+    rows = {row[0]: row[1:] for row in cur}
+    return {docid: doc_info(docid, *rows.get(docid, ())) for docid in docids}
+
+
+def get_documents(docids):
+    """Look up metadata for docids, in the given order.
+
+    Records come from the DocCache when possible; the rest are read from
+    the database with one batched query and cached.  Documents missing from
+    the database get blank metadata.
+    """
+    docids = [int(docid) for docid in docids]
+    doc_cache = get_doc_cache()
+    docs = doc_cache.get_many(docids)
+
+    missing = [docid for docid in docids if docid not in docs]
+    if missing:
+        for doc in query_documents(missing).values():
+            doc_cache.put(doc)
+            docs[doc["docid"]] = doc
+    return [docs[docid] for docid in docids]
+
+
+def warm_doc_cache(pagerank_path, num_docs):
+    """Preload the DocCache with the num_docs highest-PageRank documents.
+
+    pagerank_path is a "docid,rank" file like the Index server's
+    pagerank.out.  Returns the number of documents loaded.
+    """
+    with open(pagerank_path, "r", encoding="utf-8") as infile:
+        ranks = (line.split(",") for line in infile if line.strip())
+        top = heapq.nlargest(
+            num_docs, ranks, key=lambda fields: float(fields[1])
+        )
+
+    doc_cache = get_doc_cache()
+    docs = query_documents([int(docid) for docid, _ in top])
+    for doc in docs.values():
+        doc_cache.put(doc)
+    return len(docs)
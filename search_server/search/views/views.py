@@ -1,32 +1,71 @@
 #!/usr/bin/env python3
 """Search server views: main search page and integration with Index servers."""
 
-from flask import Blueprint, request, render_template, current_app
-import urllib.parse
-import sqlite3
-import concurrent.futures
-import requests
-import search.config as config
+import heapq
+import itertools
+import threading
+from flask import (
+    Blueprint, request, render_template, current_app, jsonify,
+)
+from search import config, model
+from search.fanout import FanOut, FanOutConfig, replica_urls
 
 # Blueprint for all search routes
 main = Blueprint("main", __name__)
 
+# Guards creating the shared FanOut client
+FANOUT_LOCK = threading.Lock()
 
-def fetch_hits(url, query, weight):
-    """Fetch is for you deorio thanks."""
-    params = {"q": query, "w": weight}
-    try:
-        resp = requests.get(url, params=params, timeout=5)
-        resp.raise_for_status()
-        payload = resp.json()
-        return payload.get("hits", [])
-    except requests.RequestException:
-        return []
 
+def get_fanout(urls):
+    """Return the app's shared FanOut client for urls.
 
-def get_all_hits(query, weight):
+    The client, its thread pool and its connections live as long as the
+    app.  It is rebuilt only if the segment URLs or fan-out settings in the
+    config change.  The old client isn't closed, since searches on other
+    threads may still be using it; its pool threads exit and its
+    connections close once it is garbage collected.
     """
-    Query all index segments in parallel and collect their hits.
+    config_get = current_app.config.get
+    settings = (replica_urls(urls), FanOutConfig(
+        workers_per_segment=config_get(
+            "SEARCH_FANOUT_WORKERS_PER_SEGMENT", 4
+        ),
+        deadline=config_get("SEARCH_FANOUT_DEADLINE", 5.0),
+        hedge_after=config_get("SEARCH_HEDGE_AFTER", None),
+        eject_after=config_get("SEARCH_EJECT_AFTER", 3),
+        eject_seconds=config_get("SEARCH_EJECT_SECONDS", 10.0),
+    ))
+    current = current_app.extensions.get("search_fanout")
+    if current is not None and current[0] == settings:
+        return current[1]
+
+    with FANOUT_LOCK:
+        current = current_app.extensions.get("search_fanout")
+        if current is None or current[0] != settings:
+            current = (settings, FanOut(*settings))
+            current_app.extensions["search_fanout"] = current
+    return current[1]
+
+
+def segment_urls():
+    """Return SEARCH_INDEX_SEGMENT_API_URLS from the app config."""
+    # Prefer live config from the app (tests may override this),
+    # fall back to the module-level default in search.config.
+    return current_app.config.get(
+        "SEARCH_INDEX_SEGMENT_API_URLS",
+        getattr(config, "SEARCH_INDEX_SEGMENT_API_URLS", []),
+    )
+
+
+def rank(hit):
+    """Return the sort key of a hit: score descending, then docid."""
+    return -float(hit.get("score", 0.0)), int(hit.get("docid", 0))
+
+
+def get_segment_hits(query, weight, k):
+    """
+    Query all index segments in parallel for their top k hits.
 
     Reads SEARCH_INDEX_SEGMENT_API_URLS from the Flask app config first,
     falling back to search.config.SEARCH_INDEX_SEGMENT_API_URLS.
@@ -34,70 +73,37 @@ def get_all_hits(query, weight):
     Args:
         query: Raw query string.
         weight: PageRank weight.
+        k: Number of hits to request from each segment.
 
     Returns:
-        A single flat list of hit dicts from all segments.
+        (One list of hit dicts per segment, each already sorted by rank(),
+        True if some segment didn't answer in time).
     """
-    # Prefer live config from the app (tests may override this),
-    # fall back to the module-level default in search.config.
-    urls = current_app.config.get(
-        "SEARCH_INDEX_SEGMENT_API_URLS",
-        getattr(config, "SEARCH_INDEX_SEGMENT_API_URLS", []),
-    )
-
+    urls = segment_urls()
     if not urls:
-        return []
-
-    hits = []
-    # One worker per URL so all segments can be queried concurrently
-    with concurrent.futures.ThreadPoolExecutor(
-        max_workers=len(urls)
-    ) as executor:
-        futures = [
-            executor.submit(fetch_hits, url, query, weight) for url in urls
-        ]
-        for fut in concurrent.futures.as_completed(futures):
-            segment_hits = fut.result()
-            if segment_hits:
-                hits.extend(segment_hits)
-
-    return hits
-
-
-def fetch_doc_info(docid):
-    """Look up document metadata (title, summary, url) for a given docid."""
-    db_path = current_app.config.get("SEARCH_DB_PATH", "var/search.sqlite3")
-
-    with sqlite3.connect(db_path) as conn:
-        cur = conn.cursor()
-        cur.execute(
-            "SELECT title, summary, url FROM documents WHERE docid = ?",
-            (docid,),
-        )
-        row = cur.fetchone()
-
-    if row:
-        title, summary, url = row
-        title = title or ""
-        summary = summary or ""
-        url = url or ""
-        return {
-            "docid": docid,
-            "title": title,
-            "summary": summary,
-            "url": url,
-            # Decoded URL text for display in <a class="doc_url">...</a>
-            "url_display": urllib.parse.unquote(url),
-        }
-
-    # If document metadata is missing, return blanks
-    return {
-        "docid": docid,
-        "title": "",
-        "summary": "",
-        "url": "",
-        "url_display": "",
-    }
+        return [], False
+
+    # The shared pool and keep-alive sessions query all segments at once
+    return get_fanout(urls).get({"q": query, "w": weight, "k": k})
+
+
+def merge_hits(segment_hits, start, stop):
+    """Return ranked hits start..stop of the merged segment results.
+
+    Segments return hits already sorted by rank(), so a k-way heap merge
+    yields the global order lazily and stops once stop hits are produced.
+    """
+    merged = heapq.merge(*segment_hits, key=rank)
+    return list(itertools.islice(merged, start, stop))
+
+
+def parse_page(page_str):
+    """Parse the 1-based result page number, defaulting to 1."""
+    try:
+        page = int(page_str)
+    except (TypeError, ValueError):
+        return 1
+    return max(page, 1)
 
 
 @main.route("/", methods=["GET"])
@@ -105,26 +111,42 @@ def index():
     """Route search page (GET /)."""
     query = request.args.get("q", "")
     weight = request.args.get("w", "0.5")
+    page = parse_page(request.args.get("p"))
+    page_size = current_app.config.get("SEARCH_PAGE_SIZE", 10)
 
     results = []
+    has_next = False
+    degraded = False
 
     # Only perform a search if there is a non-empty query string.
     if (query or "").strip():
-        all_hits = get_all_hits(query, weight)
-
-        all_hits.sort(
-            key=lambda h: (
-                -float(h.get("score", 0.0)),
-                int(h.get("docid", 0)),
-            )
+        # Every hit on this page is within each segment's top `stop`, and
+        # one extra hit tells whether there is a next page
+        start = (page - 1) * page_size
+        stop = start + page_size + 1
+        segment_hits, degraded = get_segment_hits(query, weight, stop)
+        top_hits = merge_hits(segment_hits, start, stop)
+        has_next = len(top_hits) > page_size
+
+        # Fetch metadata for all top docids at once, in rank order
+        results = model.get_documents(
+            hit["docid"] for hit in top_hits[:page_size]
         )
 
-        top_hits = all_hits[:10]
-
-        # Fetch metadata for each top docid
-        results = [fetch_doc_info(hit["docid"]) for hit in top_hits]
-
     # Render GUI template
     return render_template(
-        "index.html", results=results, query=query, weight=weight
+        "index.html", results=results, query=query, weight=weight,
+        page=page, has_next=has_next, degraded=degraded,
     )
+
+
+@main.route("/cache/", methods=["GET"])
+def doc_cache_stats():
+    """Return document metadata cache counters and hit rate as JSON."""
+    return jsonify(model.get_doc_cache().stats())
+
+
+@main.route("/replicas/", methods=["GET"])
+def replica_stats():
+    """Return load and health of every Index replica as JSON."""
+    return jsonify(get_fanout(segment_urls()).stats())
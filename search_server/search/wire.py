@@ -0,0 +1,59 @@
+"""
+Decoding of the Index server's binary hits format.
+
+Index servers answer with it when asked via Accept, see ACCEPT.  The
+layout (little-endian) is
+
+    count       u32
+    docids      u32[count]
+    scores      f64[count]
+
+in rank order.  Older Index servers, and anyone else, answer with JSON.
+"""
+
+import struct
+import sys
+from array import array
+
+HITS_MEDIA_TYPE = "application/x-index-hits"
+
+# Prefer the binary format, accept JSON
+ACCEPT = f"{HITS_MEDIA_TYPE}, application/json;q=0.5"
+
+COUNT = struct.Struct("<I")
+
+
+def decode_hits(body):
+    """Return the hit dicts of a binary hits body.
+
+    Raises ValueError if body is truncated or has trailing bytes.
+    """
+    try:
+        (count,) = COUNT.unpack_from(body)
+    except struct.error as err:
+        raise ValueError(f"Truncated hits body: {err}") from err
+    if len(body) != COUNT.size + 12 * count:
+        raise ValueError(
+            f"Hits body of {len(body)} bytes doesn't hold {count} hits"
+        )
+
+    docids = array("I")
+    scores = array("d")
+    split = COUNT.size + 4 * count
+    docids.frombytes(body[COUNT.size:split])
+    scores.frombytes(body[split:])
+    if sys.byteorder == "big":
+        docids.byteswap()
+        scores.byteswap()
+    return [
+        {"docid": docid, "score": score}
+        for docid, score in zip(docids, scores)
+    ]
+
+
+def response_hits(resp):
+    """Return the hit dicts of an Index server hits response."""
+    content_type = resp.headers.get("Content-Type", "")
+    if content_type.split(";")[0].strip() == HITS_MEDIA_TYPE:
+        return decode_hits(resp.content)
+    return resp.json().get("hits", [])
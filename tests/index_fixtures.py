@@ -43,3 +43,28 @@ def setup_teardown_index_client():
 
     # Teardown code starts here
     LOGGER.info("Teardown test fixture 'index_client'")
+
+
+@pytest.fixture(name="load_segment")
+def setup_teardown_load_segment():
+    """Load a different segment into the Index server for one test.
+
+    Yields a function that points INDEX_PATH at a segment and reloads it.  The
+    segment's grandparent directory must contain stopwords.txt and
+    pagerank.out, like index_server/index.  The default segment is reloaded
+    during teardown.
+    """
+    LOGGER.info("Setup test fixture 'load_segment'")
+    index.app.config["TESTING"] = True
+    default_index_path = index.app.config["INDEX_PATH"]
+
+    def load_segment(index_path):
+        index.app.config["INDEX_PATH"] = index_path
+        index.api.load_index()
+        return index.app.test_client()
+
+    yield load_segment
+
+    LOGGER.info("Teardown test fixture 'load_segment'")
+    index.app.config["INDEX_PATH"] = default_index_path
+    index.api.load_index()
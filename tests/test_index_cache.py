@@ -0,0 +1,161 @@
+"""Index server result cache tests."""
+import sys
+from array import array
+from collections import Counter
+import index
+from index.api import cache, vectorized
+from test_index_segment import TEXT_SEGMENTS, make_index_dir
+
+# We need to import test fixtures in specific test files because the fixture
+# imports student code (like the index server).  If the student isn't finished
+# with their code, then earlier tests (like pipeline tests) won't even run.
+# pylint: disable-next=unused-import
+from index_fixtures import setup_teardown_load_segment
+
+
+def test_lru_byte_budget():
+    """Least recently used entries are evicted to stay within budget."""
+    hits = [(1, 0.5), (2, 0.25)]
+    size = cache.result_size(hits)
+    results = cache.ResultCache(max_bytes=2 * size)
+
+    results.put("a", hits)
+    results.put("b", hits)
+    assert results.get("a") == hits  # "b" is now least recently used
+    results.put("c", hits)
+    assert results.get("b") is None
+    assert results.get("a") == hits
+    assert results.get("c") == hits
+
+    stats = results.stats()
+    assert stats["hits"] == 3
+    assert stats["misses"] == 1
+    assert stats["entries"] == 2
+    assert stats["bytes"] == 2 * size
+
+    # Entries larger than the whole budget are never cached
+    results.put("d", hits * 10)
+    assert results.get("d") is None
+
+
+def test_ttl(mocker):
+    """Entries expire ttl seconds after they are cached.
+
+    'mocker' is a fixture provided by the pytest-mock package.
+    """
+    clock = mocker.patch("time.monotonic", return_value=100.0)
+    results = cache.ResultCache(max_bytes=1 << 20, ttl=10)
+    results.put("a", [])
+    clock.return_value = 109.0
+    assert results.get("a") == []
+    clock.return_value = 110.0
+    assert results.get("a") is None
+    assert results.stats()["entries"] == 0
+
+
+def test_query_key():
+    """Keys ignore query term order but not term counts or options."""
+    key = cache.query_key(Counter(["water", "bottle"]), 0.5, None)
+    assert key == cache.query_key(Counter(["bottle", "water"]), 0.5, None)
+    assert key != cache.query_key(Counter(["water", "water"]), 0.5, None)
+    assert key != cache.query_key(Counter(["water", "bottle"]), 0.5, 10)
+    assert cache.quantize_weight(0.1 + 0.2) == cache.quantize_weight(0.3)
+
+
+def test_entry_count():
+    """With entry_count sizes, max_bytes bounds the number of entries."""
+    recent = cache.ResultCache(max_bytes=2)
+    recent.put("a", 0.3, cache.entry_count)
+    recent.put("b", 0.3, cache.entry_count)
+    assert recent.get("a") == 0.3  # "b" is now least recently used
+    recent.put("c", 0.3, cache.entry_count)
+    assert recent.get("b") is None
+    assert recent.stats()["entries"] == 2
+
+
+def test_sims_size():
+    """Sims are sized by their data, whether they own it or not."""
+    sims = (array("I", range(1000)), array("d", [0.5] * 1000))
+    expected = sys.getsizeof(sims) + 4 * 1000 + 8 * 1000
+    assert cache.sims_size(sims) == expected
+    if vectorized.available():
+        np = vectorized.np
+        owned = (np.arange(1000, dtype=np.uint32), np.full(1000, 0.5))
+        assert cache.sims_size(owned) == expected
+        views = (owned[0][:500], owned[1][:500])
+        assert cache.sims_size(views) == \
+            sys.getsizeof(views) + 4 * 500 + 8 * 500
+
+
+def test_cached_hits(tmpdir, load_segment):
+    """Repeated queries are served from the cache until the next reload.
+
+    'load_segment' is a fixture function that reloads the Index server with a
+    different segment and restores the default one afterward.
+    """
+    index_path = make_index_dir(tmpdir, TEXT_SEGMENTS[1])
+    client = load_segment(index_path)
+    first = client.get("/api/v1/hits/?q=beverage+beverage&w=0.3").get_json()
+    again = client.get("/api/v1/hits/?q=Beverage+beverage&w=0.3").get_json()
+    assert first["hits"]
+    assert again == first
+    stats = client.get("/api/v1/cache/").get_json()
+    assert stats["results"]["hits"] == 1
+    assert stats["results"]["misses"] == 1
+
+    # A new weight misses the result cache but reuses the tf-idf sims
+    client.get("/api/v1/hits/?q=beverage+beverage&w=0.7")
+    stats = client.get("/api/v1/cache/").get_json()
+    assert stats["results"]["misses"] == 2
+    assert stats["sims"]["hits"] == 1
+    assert stats["sims"]["misses"] == 1
+
+    # Reloading the segment starts with empty caches
+    client = load_segment(index_path)
+    stats = client.get("/api/v1/cache/").get_json()
+    assert stats["results"]["entries"] == 0
+    assert stats["sims"]["entries"] == 0
+    again = client.get("/api/v1/hits/?q=beverage+beverage&w=0.3").get_json()
+    assert again == first
+
+
+def test_sims_cached_on_new_weight(tmpdir, load_segment):
+    """Queries with k are pruned until they come back with a new weight."""
+    index_path = make_index_dir(tmpdir, TEXT_SEGMENTS[1])
+    client = load_segment(index_path)
+    url = "/api/v1/hits/?q=beverage&k=2&w="
+    first = client.get(url + "0.3").get_json()
+    assert first["hits"]
+    stats = client.get("/api/v1/cache/").get_json()
+    assert stats["sims"]["entries"] == 0
+
+    # The second weight scores every match and caches the sims ...
+    second = client.get(url + "0.7").get_json()
+    stats = client.get("/api/v1/cache/").get_json()
+    assert stats["sims"]["entries"] == 1
+    assert stats["sims"]["misses"] == 2
+
+    # ... which later weights re-blend without touching the postings
+    third = client.get(url + "0.5").get_json()
+    stats = client.get("/api/v1/cache/").get_json()
+    assert stats["sims"]["hits"] == 1
+    assert second["hits"] and third["hits"]
+
+
+def test_weight_rounding(tmpdir, load_segment, mocker):
+    """Weights are rounded for scoring only while the result cache is on.
+
+    'mocker' is a fixture provided by the pytest-mock package.
+    """
+    index_path = make_index_dir(tmpdir, TEXT_SEGMENTS[1])
+    client = load_segment(index_path)
+    rounded = client.get("/api/v1/hits/?q=beverage&w=0.123").get_json()
+    exact = client.get("/api/v1/hits/?q=beverage&w=0.1234").get_json()
+    assert exact == rounded
+
+    mocker.patch.dict(index.app.config, {"INDEX_CACHE_BYTES": "0"})
+    client = load_segment(index_path)
+    exact = client.get("/api/v1/hits/?q=beverage&w=0.1234").get_json()
+    assert exact != rounded
+    assert [hit["docid"] for hit in exact["hits"]] == \
+        [hit["docid"] for hit in rounded["hits"]]
@@ -0,0 +1,89 @@
+"""Index server compression and conditional request tests."""
+import gzip
+import json
+import zlib
+import index
+from index.api import main
+from test_index_reload import replace_segment
+from test_index_segment import TEXT_SEGMENTS, make_index_dir
+
+# We need to import test fixtures in specific test files because the fixture
+# imports student code (like the index server).  If the student isn't finished
+# with their code, then earlier tests (like pipeline tests) won't even run.
+# pylint: disable-next=unused-import
+from index_fixtures import setup_teardown_load_segment
+
+QUERY = "/api/v1/hits/?q=beverage+beverage&w=0.3"
+
+
+def test_etag(tmpdir, load_segment, mocker):
+    """Clients revalidate hits against the segment version.
+
+    'load_segment' is a fixture function that reloads the Index server with a
+    different segment and restores the default one afterward.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    """
+    index_path = make_index_dir(tmpdir, TEXT_SEGMENTS[1])
+    client = load_segment(index_path)
+    response = client.get(QUERY)
+    etag, weak = response.get_etag()
+    assert etag and weak
+    assert response.cache_control.no_cache
+    assert response.cache_control.public
+
+    # A matching ETag is answered without searching
+    spy = mocker.spy(main, "search_segment")
+    response = client.get(QUERY, headers={"If-None-Match": f'W/"{etag}"'})
+    assert response.status_code == 304
+    assert response.get_etag() == (etag, True)
+    assert spy.call_count == 0
+
+    # Other queries and formats have other ETags
+    assert client.get(QUERY + "&k=1").get_etag()[0] != etag
+    binary = client.get(QUERY, headers={"Accept": "application/x-index-hits"})
+    assert binary.get_etag()[0] != etag
+
+    # A rebuilt segment invalidates cached copies
+    replace_segment(index_path, TEXT_SEGMENTS[1])
+    client = load_segment(index_path)
+    response = client.get(QUERY, headers={"If-None-Match": f'W/"{etag}"'})
+    assert response.status_code == 200
+    assert response.get_etag()[0] != etag
+
+    mocker.patch.dict(index.app.config, {"INDEX_HITS_MAX_AGE": "60"})
+    response = client.get(QUERY)
+    assert response.cache_control.max_age == 60
+    assert not response.cache_control.no_cache
+
+
+def test_compression(tmpdir, load_segment, mocker):
+    """Responses above the threshold are compressed if the client accepts it.
+
+    'load_segment' is a fixture function that reloads the Index server with a
+    different segment and restores the default one afterward.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    """
+    client = load_segment(make_index_dir(tmpdir, TEXT_SEGMENTS[1]))
+    body = client.get(QUERY).get_data()
+    response = client.get(QUERY, headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers  # disabled by default
+
+    assert len(json.loads(body)["hits"]) > 1
+    mocker.patch.dict(index.app.config, {"INDEX_COMPRESS_BYTES": len(body)})
+    response = client.get(QUERY, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.vary
+    assert gzip.decompress(response.get_data()) == body
+
+    response = client.get(QUERY, headers={"Accept-Encoding": "deflate"})
+    assert response.headers["Content-Encoding"] == "deflate"
+    assert zlib.decompress(response.get_data()) == body
+
+    # Small responses and clients without Accept-Encoding get plain bodies
+    response = client.get(
+        QUERY + "&k=1", headers={"Accept-Encoding": "gzip"}
+    )
+    assert "Content-Encoding" not in response.headers
+    assert "Content-Encoding" not in client.get(QUERY).headers
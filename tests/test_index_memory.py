@@ -0,0 +1,63 @@
+"""Index server shared memory tests."""
+import gc
+import os
+from pathlib import Path
+from index import memory
+from test_index_segment import TEXT_SEGMENTS, make_index_dir
+
+# We need to import test fixtures in specific test files because the fixture
+# imports student code (like the index server).  If the student isn't finished
+# with their code, then earlier tests (like pipeline tests) won't even run.
+# pylint: disable-next=unused-import
+from index_fixtures import setup_teardown_load_segment
+
+SMAPS_ROLLUP = """\
+00400000-7ffc1b5fe000 ---p 00000000 00:00 0    [rollup]
+Rss:              204800 kB
+Pss:               81920 kB
+Shared_Clean:     153600 kB
+Shared_Dirty:       2048 kB
+Private_Clean:      1024 kB
+Private_Dirty:     48128 kB
+Swap:                  0 kB
+"""
+
+
+def test_smaps_rollup(tmpdir, mocker):
+    """Memory use is parsed from /proc/<pid>/smaps_rollup.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    """
+    proc = Path(tmpdir)
+    mocker.patch.object(memory, "PROC", proc)
+    (proc/"42"/"task"/"42").mkdir(parents=True)
+    (proc/"42"/"smaps_rollup").write_text(SMAPS_ROLLUP, encoding="utf-8")
+    (proc/"42"/"task"/"42"/"children").write_text("44 43 ", encoding="utf-8")
+
+    usage = memory.smaps_rollup(42)
+    assert usage["Rss"] == 204800
+    assert usage["Pss"] == 81920
+    assert usage["Private"] == 1024 + 48128
+    assert "Swap" not in usage
+    assert memory.children(42) == [43, 44]
+
+    # Not running, or not Linux
+    assert not memory.smaps_rollup(7)
+    assert not memory.children(7)
+
+
+def test_frozen_after_load(tmpdir, load_segment):
+    """Loaded index objects are exempt from garbage collection.
+
+    'load_segment' is a fixture function that reloads the Index server with a
+    different segment and restores the default one afterward.
+    """
+    gc.unfreeze()
+    index_path = make_index_dir(tmpdir, TEXT_SEGMENTS[0])
+    client = load_segment(index_path)
+    assert gc.get_freeze_count() > 0
+
+    usage = client.get("/api/v1/memory/").get_json()
+    assert usage["pid"] == os.getpid()
+    if os.path.exists("/proc/self/smaps_rollup"):
+        assert usage["Private"] > 0
@@ -0,0 +1,68 @@
+"""Index server multi-segment mode tests."""
+import shutil
+import pytest
+import index
+from test_index_segment import TEXT_SEGMENTS, make_index_dir
+
+# We need to import test fixtures in specific test files because the fixture
+# imports student code (like the index server).  If the student isn't finished
+# with their code, then earlier tests (like pipeline tests) won't even run.
+# pylint: disable-next=unused-import
+from index_fixtures import setup_teardown_load_segment
+
+QUERIES = ["beverage", "amazing beverage", "coffee", "cider beverage", "zzz"]
+
+
+def rank(hit):
+    """Return the sort key of a hit: score descending, then docid."""
+    return -hit["score"], hit["docid"]
+
+
+@pytest.mark.parametrize("scorer", ["python", "numpy"])
+def test_multi_segment(tmpdir, load_segment, mocker, scorer):
+    """One process serving every segment merges their hits.
+
+    'load_segment' is a fixture function that reloads the Index server with a
+    different segment and restores the default one afterward.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    """
+    mocker.patch.dict(index.app.config, {"INDEX_SCORER": scorer})
+    index_path = make_index_dir(tmpdir, TEXT_SEGMENTS[0])
+    paths = [index_path]
+    for number, text_path in enumerate(TEXT_SEGMENTS[1:], 1):
+        paths.append(index_path.with_name(f"inverted_index_{number}.txt"))
+        shutil.copy(text_path, paths[-1])
+
+    # Expected: each segment served on its own
+    single = []
+    for path in paths:
+        client = load_segment(path)
+        single.append({
+            query: client.get(f"/api/v1/hits/?q={query}").get_json()["hits"]
+            for query in QUERIES
+        })
+
+    mocker.patch.dict(index.app.config, {"INDEX_PATHS": paths})
+    index.api.load_index()
+    client = index.app.test_client()
+    segments = client.get("/api/v1/segments/").get_json()["segments"]
+    assert [segment["path"] for segment in segments] == \
+        [str(path) for path in paths]
+
+    for query in QUERIES:
+        expected = sorted(
+            (hit for hits in single for hit in hits[query]), key=rank
+        )
+        merged = client.get(f"/api/v1/hits/?q={query}").get_json()["hits"]
+        assert merged == expected
+        top = client.get(f"/api/v1/hits/?q={query}&k=2").get_json()["hits"]
+        assert top == expected[:2]
+
+        for number, segment in enumerate(segments):
+            hits = client.get(f"{segment['hits']}?q={query}").get_json()
+            assert hits["hits"] == single[number][query]
+
+    assert client.get("/api/v1/segments/3/hits/?q=coffee").status_code == 404
+    stats = client.get("/api/v1/cache/").get_json()
+    assert stats["results"]["misses"] == 2 * len(QUERIES) * len(paths)
@@ -0,0 +1,173 @@
+"""Index server hot reload tests."""
+import os
+import shutil
+import time
+import pytest
+from index import api, app
+from index.api import reload
+from test_index_segment import TEXT_SEGMENTS, make_index_dir
+
+# We need to import test fixtures in specific test files because the fixture
+# imports student code (like the index server).  If the student isn't finished
+# with their code, then earlier tests (like pipeline tests) won't even run.
+# pylint: disable-next=unused-import
+from index_fixtures import setup_teardown_load_segment
+
+QUERY = "/api/v1/hits/?q=beverage+beverage&w=0.3"
+
+
+def replace_segment(index_path, text_path):
+    """Rename a copy of text_path over index_path, as a rebuild would."""
+    new_path = index_path.with_suffix(".new")
+    shutil.copy(text_path, new_path)
+    os.replace(new_path, index_path)
+    # A new mtime even on filesystems with coarse timestamps
+    stat = index_path.stat()
+    os.utime(index_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+
+
+def wait_for_reload(client):
+    """Return the reload status once the background reload finished."""
+    for _ in range(500):
+        status = client.get("/api/v1/reload/").get_json()
+        if status["state"] != "loading":
+            return status
+        time.sleep(0.01)
+    raise AssertionError("reload did not finish")
+
+
+def test_reload(tmpdir, load_segment):
+    """A reload swaps in the rebuilt segment; old requests keep the old one.
+
+    'load_segment' is a fixture function that reloads the Index server with a
+    different segment and restores the default one afterward.
+    """
+    index_path = make_index_dir(tmpdir, TEXT_SEGMENTS[0])
+    client = load_segment(index_path)
+    old_segment = api.SEGMENTS[0]
+    old_hits = client.get(QUERY).get_json()
+    status = client.get("/api/v1/reload/").get_json()
+    version = status["segments"][0]["version"]
+    assert version == old_segment.version
+
+    replace_segment(index_path, TEXT_SEGMENTS[1])
+    assert reload.stale()
+    assert client.post("/api/v1/reload/").status_code == 202
+    status = wait_for_reload(client)
+    assert status["state"] == "idle"
+    assert status["segments"][0]["version"] != version
+    assert not reload.stale()
+
+    # New requests see the new segment, with fresh caches
+    assert api.SEGMENTS[0] is not old_segment
+    assert client.get(QUERY).get_json() != old_hits
+    assert api.SEGMENTS[0].result_cache.stats()["misses"] == 1
+
+    # A request holding the old segment still reads it consistently
+    assert old_segment.inverted_index
+    assert len(old_segment.pagerank) == len(old_segment.docids)
+
+
+def test_reload_failed(tmpdir, load_segment, mocker):
+    """A failed reload keeps serving the old segment.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    """
+    index_path = make_index_dir(tmpdir, TEXT_SEGMENTS[1])
+    client = load_segment(index_path)
+    hits = client.get(QUERY).get_json()
+    segment = api.SEGMENTS[0]
+
+    # One reload at a time
+    mocker.patch.dict(reload.STATUS, {"state": "loading"})
+    assert client.post("/api/v1/reload/").status_code == 409
+    mocker.stopall()
+
+    index_path.unlink()
+    assert client.post("/api/v1/reload/").status_code == 202
+    status = wait_for_reload(client)
+    assert status["state"] == "failed"
+    assert status["error"]
+    assert api.SEGMENTS[0] is segment
+    assert client.get(QUERY).get_json() == hits
+
+
+def test_reload_signal(tmpdir, load_segment):
+    """RELOAD_SIGNAL starts a background reload."""
+    index_path = make_index_dir(tmpdir, TEXT_SEGMENTS[0])
+    client = load_segment(index_path)
+    segment = api.SEGMENTS[0]
+
+    os.kill(os.getpid(), reload.RELOAD_SIGNAL)
+    status = wait_for_reload(client)
+    assert status["state"] == "idle"
+    assert api.SEGMENTS[0] is not segment
+
+
+# The unexpected error is left to the reload thread to log
+@pytest.mark.filterwarnings(
+    "ignore::pytest.PytestUnhandledThreadExceptionWarning"
+)
+def test_reload_malformed(tmpdir, load_segment):
+    """A reload failing with any error can be retried once fixed."""
+    index_path = make_index_dir(tmpdir, TEXT_SEGMENTS[1])
+    client = load_segment(index_path)
+    hits = client.get(QUERY).get_json()
+    segment = api.SEGMENTS[0]
+
+    # A term without an idf or postings
+    with open(index_path, "a", encoding="utf-8") as outfile:
+        print("lonelyterm", file=outfile)
+    assert client.post("/api/v1/reload/").status_code == 202
+    status = wait_for_reload(client)
+    assert status["state"] == "failed"
+    assert status["error"]
+    assert api.SEGMENTS[0] is segment
+    assert client.get(QUERY).get_json() == hits
+
+    replace_segment(index_path, TEXT_SEGMENTS[1])
+    assert client.post("/api/v1/reload/").status_code == 202
+    assert wait_for_reload(client)["state"] == "idle"
+    assert api.SEGMENTS[0] is not segment
+
+
+def test_signal_while_loading(mocker):
+    """A RELOAD_SIGNAL arriving during the first load is ignored.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    """
+    load_index = api.load_index
+
+    def signalled_load():
+        os.kill(os.getpid(), reload.RELOAD_SIGNAL)
+        time.sleep(0.2)  # the handler's thread finds a load running
+        load_index()
+
+    mock = mocker.patch.object(api, "load_index", side_effect=signalled_load)
+    reload.load()
+    time.sleep(0.1)
+    assert mock.call_count == 1
+    assert reload.STATUS["state"] == "idle"
+
+
+def test_reload_workers(tmpdir, load_segment, mocker):
+    """Under gunicorn a POST signals every worker of the master to reload.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    """
+    index_path = make_index_dir(tmpdir, TEXT_SEGMENTS[0])
+    client = load_segment(index_path)
+    segment = api.SEGMENTS[0]
+
+    # This process stands in for the only worker of its parent
+    mocker.patch.dict(app.config, {"INDEX_MASTER_PID": os.getppid()})
+    children = mocker.patch(
+        "index.memory.children", return_value=[os.getpid()]
+    )
+    response = client.post("/api/v1/reload/")
+    assert response.status_code == 202
+    assert response.get_json()["pid"] == os.getpid()
+    children.assert_called_once_with(os.getppid())
+    time.sleep(0.1)  # the signal handler starts the reload in a thread
+    assert wait_for_reload(client)["state"] == "idle"
+    assert api.SEGMENTS[0] is not segment
@@ -0,0 +1,282 @@
+"""Index server query evaluation tests."""
+import random
+from array import array
+import pytest
+import index
+from index.api import retrieval, vectorized
+from index import segment
+from index.segment import parse_text_line
+from test_index_segment import (
+    TEXT_SEGMENTS, make_index_dir, run_positional_pipeline,
+)
+
+# We need to import test fixtures in specific test files because the fixture
+# imports student code (like the index server).  If the student isn't finished
+# with their code, then earlier tests (like pipeline tests) won't even run.
+# pylint: disable-next=unused-import
+from index_fixtures import setup_teardown_load_segment
+
+
+def test_gallop():
+    """Galloping search agrees with a linear scan from every start index."""
+    docids = array("I", [2, 3, 5, 8, 13, 21, 34, 55, 89])
+    for target in range(0, 100):
+        for lo in range(len(docids) + 1):
+            expected = next(
+                (i for i in range(lo, len(docids)) if docids[i] >= target),
+                len(docids),
+            )
+            assert retrieval.gallop(docids, target, lo) == expected
+
+
+def test_intersect():
+    """Galloping intersection matches set intersection with positions."""
+    rng = random.Random(485)
+    for _ in range(200):
+        lists = [
+            array("I", sorted(rng.sample(range(500), rng.randint(1, 300))))
+            for _ in range(rng.randint(1, 4))
+        ]
+        expected = sorted(set(lists[0]).intersection(*lists[1:]))
+        actual = list(retrieval.intersect(lists))
+        assert [docid for docid, _ in actual] == expected
+        for docid, positions in actual:
+            assert all(
+                docids[i] == docid for docids, i in zip(lists, positions)
+            )
+
+
+def test_top_k():
+    """Bounded top-k selection agrees with a full sort, ties by docid."""
+    rng = random.Random(485)
+    scored = [(docid, rng.choice([0.1, 0.2, 0.3])) for docid in range(100)]
+    rng.shuffle(scored)
+    expected = sorted(scored, key=lambda hit: (-hit[1], hit[0]))
+    assert retrieval.top_k(iter(scored)) == expected
+    for k in [1, 5, 33, 100, 200]:
+        assert retrieval.top_k(iter(scored), k) == expected[:k]
+
+
+def random_postings(rng, term, num_docs):
+    """Return a random PostingList for term, with repeated tf and norms."""
+    docids = sorted(rng.sample(range(num_docs), rng.randint(1, num_docs)))
+    fields = [term, str(rng.choice([0.1, 0.5, 1.0]))]
+    for docid in docids:
+        fields += [
+            str(docid), str(rng.randint(1, 3)), str(rng.choice([1.0, 2.0])),
+        ]
+    return parse_text_line(" ".join(fields))[1]
+
+
+def test_pruned_top_k_matches_exhaustive():
+    """MaxScore-pruned top-k returns exactly the exhaustive scorer's hits.
+
+    Scores are built from a handful of values so there are many exact ties,
+    which must still be broken by docid just like the exhaustive sort.
+    """
+    rng = random.Random(485)
+    num_docs = 300
+    pagerank = array("d", (
+        rng.choice([0.0, 0.001, 0.002, 0.01]) for _ in range(num_docs)
+    ))
+    max_pagerank = max(pagerank)
+
+    for _ in range(200):
+        lists = [
+            (random_postings(rng, f"t{j}", num_docs), rng.random())
+            for j in range(rng.randint(1, 3))
+        ]
+        weight = rng.choice([0.0, 0.1, 0.5, 0.9, 1.0])
+        exhaustive = retrieval.top_k(
+            retrieval.score_conjunctive(lists, weight, pagerank)
+        )
+        sims = retrieval.tfidf_sims(lists)
+        for k in [1, 2, 10, 1000]:
+            pruned = retrieval.score_conjunctive_top_k(
+                lists, weight, pagerank, max_pagerank, k
+            )
+            assert pruned == exhaustive[:k]
+            assert retrieval.blend(*sims, weight, pagerank, k) == pruned
+
+
+@pytest.mark.skipif(not vectorized.available(), reason="requires NumPy")
+def test_vectorized_matches_python():
+    """NumPy scorer returns exactly the pure-Python scorer's hits."""
+    rng = random.Random(485)
+    num_docs = 300
+    pagerank = array("d", (
+        rng.choice([0.0, 0.001, 0.002, 0.01]) for _ in range(num_docs)
+    ))
+
+    for _ in range(200):
+        lists = [
+            (random_postings(rng, f"t{j}", num_docs), rng.random())
+            for j in range(rng.randint(1, 3))
+        ]
+        weight = rng.choice([0.0, 0.1, 0.5, 0.9, 1.0])
+        expected = retrieval.top_k(
+            retrieval.score_conjunctive(lists, weight, pagerank)
+        )
+        sims = vectorized.tfidf_sims(lists)
+        assert vectorized.blend(*sims, weight, pagerank) == expected
+        for k in [1, 2, 10, 1000]:
+            assert vectorized.blend(*sims, weight, pagerank, k) == \
+                expected[:k]
+
+
+def test_disjunctive_pruning_matches_exhaustive():
+    """Term-at-a-time MaxScore returns exactly the exhaustive OR hits."""
+    rng = random.Random(485)
+    num_docs = 300
+    pagerank = array("d", (
+        rng.choice([0.0, 0.001, 0.002, 0.01]) for _ in range(num_docs)
+    ))
+    max_pagerank = max(pagerank)
+
+    for _ in range(200):
+        lists = [
+            (random_postings(rng, f"t{j}", num_docs), rng.random())
+            for j in range(rng.randint(1, 4))
+        ]
+        weight = rng.choice([0.0, 0.1, 0.5, 0.9, 1.0])
+
+        # Every doc with at least one term, summed in query term order
+        sims = {}
+        for plist, w_q in lists:
+            for docid, doc_weight in zip(plist.docids, plist.weights):
+                sims[docid] = sims.get(docid, 0.0) + doc_weight * w_q
+        expected = retrieval.top_k(
+            (docid, (1.0 - weight) * sim + weight * pagerank[docid])
+            for docid, sim in sims.items()
+        )
+
+        docids, dsims = retrieval.disjunctive_sims(lists)
+        assert list(docids) == sorted(sims)
+        assert retrieval.blend(docids, dsims, weight, pagerank) == expected
+        for k in [1, 2, 10, 1000]:
+            assert retrieval.score_disjunctive_top_k(
+                lists, weight, pagerank, max_pagerank, k
+            ) == expected[:k]
+            if vectorized.available():
+                assert vectorized.score_disjunctive_top_k(
+                    lists, weight, pagerank, k
+                ) == expected[:k]
+
+
+def test_op_or(tmpdir, load_segment):
+    """op=or matches documents with any query term, op=and with all.
+
+    'load_segment' is a fixture function that reloads the Index server with a
+    different segment and restores the default one afterward.
+    """
+    client = load_segment(make_index_dir(tmpdir, TEXT_SEGMENTS[1]))
+    url = "/api/v1/hits/?q=beverage+xyzzyunknown"
+    assert client.get(url).get_json()["hits"] == []
+    assert client.get(url + "&op=and").get_json()["hits"] == []
+
+    # A missing term adds nothing, and doesn't rescale the known term's
+    # scores, which other segments holding both terms must agree with
+    hits = client.get(url + "&op=or").get_json()["hits"]
+    assert hits
+    assert hits == \
+        client.get("/api/v1/hits/?q=beverage&op=or").get_json()["hits"]
+    assert hits[:1] == client.get(url + "&op=or&k=1").get_json()["hits"]
+
+    # Without query normalization the tf-idf ranking is unchanged
+    def ranking(query):
+        hits = client.get(f"/api/v1/hits/?q={query}&w=0").get_json()["hits"]
+        return [hit["docid"] for hit in hits]
+    assert ranking("beverage&op=or") == ranking("beverage")
+
+
+@pytest.mark.skipif(not vectorized.available(), reason="requires NumPy")
+def test_op_or_vectorized(tmpdir, load_segment, mocker):
+    """The NumPy engine scores OR queries with k itself, with equal hits.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    """
+    index_path = make_index_dir(tmpdir, TEXT_SEGMENTS[1])
+    client = load_segment(index_path)
+    url = "/api/v1/hits/?q=beverage+amazing&op=or&k=3&w=0.3"
+    expected = client.get(url).get_json()["hits"]
+    assert expected
+
+    mocker.patch.dict(index.app.config, {"INDEX_SCORER": "numpy"})
+    score = mocker.spy(vectorized, "score_disjunctive_top_k")
+    client = load_segment(index_path)
+    assert client.get(url).get_json()["hits"] == expected
+    assert score.call_count == 1
+
+
+def test_phrase_docids():
+    """Phrases match where their terms occur at their offsets."""
+    def postings(docs):
+        # docs is {docid: positions}
+        return segment.PostingList(
+            1.0, array("I", docs), array("I", map(len, docs.values())),
+            array("d", [1.0] * len(docs)), array("d", [1.0] * len(docs)),
+            1.0, segment.encode_positions(
+                [p[0]] + [b - a for a, b in zip(p, p[1:])]
+                for p in docs.values()
+            ),
+        )
+
+    machine = postings({1: [0, 7], 2: [4], 3: [10], 5: [2]})
+    learning = postings({1: [8], 2: [3], 3: [12], 4: [0], 5: [3]})
+    deep = postings({3: [11], 5: [1]})
+
+    assert list(retrieval.phrase_docids([
+        [(machine, 0), (learning, 1)],
+    ])) == [1, 5]
+    assert list(retrieval.phrase_docids([
+        [(machine, 0), (learning, 2)],  # a stopword in between
+    ])) == [3]
+    assert list(retrieval.phrase_docids([
+        [(machine, 0), (learning, 1)], [(deep, 0), (machine, 1)],
+    ])) == [5]
+
+    # Without positions a phrase matches every doc with all its terms
+    assert list(retrieval.phrase_docids([[
+        (machine._replace(positions=None), 0),
+        (learning._replace(positions=None), 1),
+    ]])) == [1, 2, 3, 5]
+
+
+def test_phrase_queries(tmpdir, caplog, monkeypatch, load_segment):
+    """Quoted phrases only match documents with the words in order.
+
+    'load_segment' is a fixture function that reloads the Index server with a
+    different segment and restores the default one afterward.
+    """
+    text_paths = run_positional_pipeline(tmpdir, caplog, monkeypatch)
+    index_path = make_index_dir(tmpdir.mkdir("index"), text_paths[1])
+    segment_path = index_path.with_suffix(".seg")
+    segment.write_segment(index_path, segment_path)
+
+    def docids(client, query, op="and"):
+        hits = client.get(f"/api/v1/hits/?q={query}&op={op}").get_json()
+        return sorted(hit["docid"] for hit in hits["hits"])
+
+    for path in [index_path, segment_path]:
+        client = load_segment(path)
+
+        # 73759315 is "Baileys wow chocolate amazing", 98871292 "hot
+        # chocolate add whipped cream sleep"
+        assert docids(client, "hot chocolate") == [98871292]
+        assert docids(client, "chocolate") == [73759315, 98871292]
+        assert docids(client, '"hot chocolate"') == [98871292]
+        assert docids(client, '"chocolate hot"') == []
+        assert docids(client, '"chocolate amazing"') == [73759315]
+        assert docids(client, '"the hot chocolate"') == [98871292]
+        assert docids(client, '"hot the chocolate"') == []
+
+        # Phrases are required with op=or too, the other terms are not
+        assert docids(client, '"chocolate amazing" sleep', "or") == \
+            [73759315]
+        assert docids(client, '"chocolate amazing" sleep') == []
+        assert docids(client, 'cream "wow chocolate"', "or") == [73759315]
+
+        # Scores match the same query without quotes
+        plain = client.get("/api/v1/hits/?q=hot+chocolate").get_json()
+        quoted = client.get('/api/v1/hits/?q="hot+chocolate"').get_json()
+        assert quoted == plain
@@ -0,0 +1,271 @@
+"""Binary index segment tests."""
+import bisect
+import itertools
+import logging
+import random
+import shutil
+from pathlib import Path
+import pytest
+import utils
+from index import segment
+from index.api import retrieval
+
+# We need to import test fixtures in specific test files because the fixture
+# imports student code (like the index server).  If the student isn't finished
+# with their code, then earlier tests (like pipeline tests) won't even run.
+# pylint: disable-next=unused-import
+from index_fixtures import setup_teardown_load_segment
+
+INDEX_PKG_DIR = Path("index_server/index")
+
+# Text segments produced by the pipeline tests
+TEXT_SEGMENTS = sorted(
+    (utils.TESTDATA_DIR/"test_pipeline14/expected").glob("part-*")
+)
+
+
+def make_index_dir(tmpdir, text_path):
+    """Copy text_path into an index directory layout under tmpdir."""
+    shutil.copy(INDEX_PKG_DIR/"stopwords.txt", tmpdir)
+    shutil.copy(INDEX_PKG_DIR/"pagerank.out", tmpdir)
+    Path(tmpdir/"inverted_index").mkdir()
+    index_path = Path(tmpdir/"inverted_index/inverted_index_1.txt")
+    shutil.copy(text_path, index_path)
+    return index_path
+
+
+@pytest.mark.parametrize("plain", [False, True], ids=["blocks", "plain"])
+@pytest.mark.parametrize("text_path", TEXT_SEGMENTS, ids=lambda p: p.name)
+def test_round_trip(tmpdir, text_path, plain):
+    """Binary segment decodes to the same entries as the text segment.
+
+    Note: 'tmpdir' is a fixture provided by the pytest package.  It creates a
+    unique temporary directory before the test runs, and removes it afterward.
+    https://docs.pytest.org/en/6.2.x/tmpdir.html#the-tmpdir-fixture
+    """
+    segment_path = Path(tmpdir/"segment.seg")
+    segment.write_segment(text_path, segment_path, plain=plain)
+    assert segment.is_segment(segment_path)
+    assert not segment.is_segment(text_path)
+
+    expected = dict(segment.read_text_segment(text_path))
+
+    seg = segment.Segment(segment_path)
+    assert seg.plain == plain
+    assert list(seg) == sorted(expected)
+    assert list(seg.doc_table) == sorted({
+        docid for postings in expected.values() for docid in postings.docids
+    })
+    for term, postings in expected.items():
+        actual = seg[term]
+        assert actual.idf == postings.idf
+        assert [seg.doc_table[i] for i in actual.docids] == \
+            list(postings.docids)
+        assert list(actual.docids) == sorted(actual.docids)
+        assert list(actual.tfs) == list(postings.tfs)
+        assert list(actual.norms) == list(postings.norms)
+        assert list(actual.weights) == list(postings.weights)
+        assert actual.max_weight == postings.max_weight
+    assert "notaterm" not in seg
+
+    # Text segments are numbered the same way when loaded
+    loaded, doc_table = segment.load_text_segment(text_path)
+    assert list(doc_table) == list(seg.doc_table)
+    for term, postings in loaded.items():
+        assert list(postings.docids) == list(seg[term].docids)
+    with pytest.raises(KeyError):
+        _ = seg["notaterm"]
+
+
+@pytest.mark.parametrize("plain", [False, True], ids=["blocks", "plain"])
+def test_hits_match_text_segment(tmpdir, load_segment, plain):
+    """Index server returns the same hits from binary and text segments.
+
+    'load_segment' is a fixture function that reloads the Index server with a
+    different segment and restores the default one afterward.
+    """
+    text_path = make_index_dir(tmpdir, TEXT_SEGMENTS[1])
+    segment_path = text_path.with_suffix(".seg")
+    segment.write_segment(text_path, segment_path, plain=plain)
+
+    queries = [
+        "amazing", "beverage", "amazing beverage", "beer", "notaterm",
+        "amazing amazing beverage",
+    ]
+    for query in queries:
+        for weight in ["0", "0.3", "1"]:
+            url = f"/api/v1/hits/?q={query}&w={weight}"
+            text_hits = load_segment(text_path).get(url).get_json()
+            binary_hits = load_segment(segment_path).get(url).get_json()
+            assert binary_hits == text_hits
+
+
+def test_weighted_text_segment(tmpdir):
+    """Pipeline-emitted weights load the same as weights computed on load.
+
+    Note: 'tmpdir' is a fixture provided by the pytest package.  It creates a
+    unique temporary directory before the test runs, and removes it afterward.
+    https://docs.pytest.org/en/6.2.x/tmpdir.html#the-tmpdir-fixture
+    """
+    text_path = TEXT_SEGMENTS[1]
+    expected = dict(segment.read_text_segment(text_path))
+
+    # Same segment in the weighted format reduce5.py emits
+    weighted_path = Path(tmpdir/"weighted.txt")
+    with open(weighted_path, "w", encoding="utf-8") as outfile:
+        print("#fields docid tf norm weight", file=outfile)
+        for term, postings in expected.items():
+            fields = [term, str(postings.idf)]
+            for docid, tf, norm in zip(
+                    postings.docids, postings.tfs, postings.norms):
+                weight = (tf * postings.idf) / norm
+                fields += [f"{docid:08d}", str(tf), str(norm), str(weight)]
+            print(" ".join(fields), file=outfile)
+
+    actual = dict(segment.read_text_segment(weighted_path))
+    assert actual.keys() == expected.keys()
+    for term, postings in expected.items():
+        assert list(actual[term].weights) == list(postings.weights)
+        assert actual[term].max_weight == postings.max_weight
+
+    # Weights that can't be derived from tf, idf and norm are stored
+    with open(weighted_path, "a", encoding="utf-8") as outfile:
+        print("oddterm 1.5 99999999 2 4.0 0.125", file=outfile)
+    segment_path = Path(tmpdir/"weighted.seg")
+    segment.write_segment(weighted_path, segment_path)
+    seg = segment.Segment(segment_path)
+    assert list(seg["oddterm"].weights) == [0.125]
+    for term, postings in expected.items():
+        assert list(seg[term].weights) == list(postings.weights)
+
+
+def test_varints():
+    """Varints round trip, with one byte per 7 bits."""
+    values = [0, 1, 127, 128, 300, 16383, 16384, 2**32 - 1]
+    data = bytearray()
+    segment.encode_varints(values, data)
+    assert segment.decode_varints(data) == values
+    assert len(data) == 1 + 1 + 1 + 2 + 2 + 2 + 3 + 5
+
+    positions = segment.encode_positions([[3, 14, 23], [0], [200, 1]])
+    assert len(positions) == 3
+    assert list(positions[0]) == [3, 17, 40]
+    assert list(positions[1]) == [0]
+    assert list(positions[2]) == [200, 201]
+
+
+def run_positional_pipeline(tmpdir, caplog, monkeypatch):
+    """Run the pipeline with positions on the test crawl, return segments.
+
+    'monkeypatch' is a fixture provided by the pytest package, used here to
+    set INDEX_EMIT_POSITIONS for the pipeline's mappers and reducers.
+    """
+    monkeypatch.setenv("INDEX_EMIT_POSITIONS", "1")
+    utils.copyglob("inverted_index/map?.py", tmpdir)
+    utils.copyglob("inverted_index/reduce?.py", tmpdir)
+    utils.copyglob("inverted_index/partition.py", tmpdir)
+    utils.copyglob("inverted_index/stopwords.txt", tmpdir)
+    with tmpdir.as_cwd(), caplog.at_level(logging.DEBUG, logger="madoop"):
+        pipeline = utils.Pipeline(
+            input_dir=utils.TESTDATA_DIR/"test_pipeline14/crawl",
+            output_dir=tmpdir/"output",
+            caplog=caplog
+        )
+        output_dir = Path(pipeline.get_output_dir())
+    return sorted(output_dir.glob("part-*"))
+
+
+def test_positional_segment(tmpdir, caplog, monkeypatch):
+    """Pipeline positions survive the text and binary segment formats.
+
+    Note: 'tmpdir' is a fixture provided by the pytest package.  It creates a
+    unique temporary directory before the test runs, and removes it afterward.
+    https://docs.pytest.org/en/6.2.x/tmpdir.html#the-tmpdir-fixture
+    """
+    text_paths = run_positional_pipeline(tmpdir, caplog, monkeypatch)
+    assert [p.name for p in text_paths] == [p.name for p in TEXT_SEGMENTS]
+
+    for text_path, plain_path in zip(text_paths, TEXT_SEGMENTS):
+        expected = dict(segment.read_text_segment(plain_path))
+        actual = dict(segment.read_text_segment(text_path))
+        assert actual.keys() == expected.keys()
+
+        segment_path = Path(tmpdir/f"{text_path.name}.seg")
+        segment.write_segment(text_path, segment_path)
+        seg = segment.Segment(segment_path)
+
+        for term, postings in expected.items():
+            # Positions are an extra field, everything else is unchanged
+            assert postings.positions is None
+            assert actual[term]._replace(positions=None) == postings
+
+            positions = [list(p) for p in actual[term].positions]
+            assert list(map(len, positions)) == list(postings.tfs)
+            assert [list(p) for p in seg[term].positions] == positions
+
+    # "Blue Moon refreshing belgian beverage" is doc 18633079
+    moon = dict(segment.read_text_segment(text_paths[1]))["moon"]
+    assert list(moon.positions[list(moon.docids).index(18633079)]) == [1]
+
+
+def test_compressed_blocks(tmpdir):
+    """Postings spanning many blocks decode and seek like plain arrays.
+
+    Gaps and tfs of every packed width are covered: 70,000 documents make
+    gaps past 16 bits possible, and tfs go past 8 bits.
+    """
+    rng = random.Random(485)
+    num_docs = 70000
+    text = {
+        "all": list(range(num_docs)),
+        "sparse": sorted(rng.sample(range(num_docs), 3000)),
+        "far": [0, 300, 301, num_docs - 1],
+    }
+    text_path = Path(tmpdir/"segment.txt")
+    with open(text_path, "w", encoding="utf-8") as outfile:
+        for term, docids in text.items():
+            fields = [term, "0.5"]
+            for docid in docids:
+                fields += [f"{docid:08d}", str(rng.randint(1, 300)),
+                           str(1.0 + docid % 7)]
+            print(" ".join(fields), file=outfile)
+    segment_path = Path(tmpdir/"segment.seg")
+    segment.write_segment(text_path, segment_path)
+
+    expected = dict(segment.read_text_segment(text_path))
+    seg = segment.Segment(segment_path)
+    for term, postings in expected.items():
+        actual = seg[term]
+        assert list(actual.docids) == list(postings.docids)
+        assert [actual.docids[i] for i in range(len(postings.docids))] == \
+            list(postings.docids)
+        assert list(actual.tfs) == list(postings.tfs)
+        assert list(actual.norms) == list(postings.norms)
+        assert list(actual.weights) == list(postings.weights)
+
+        # Bulk decoders sum the packed gaps across blocks
+        if isinstance(actual.docids, segment.BlockColumn):
+            gaps = itertools.chain.from_iterable(
+                gaps for gaps, _ in actual.docids.packed()
+            )
+            assert list(itertools.accumulate(gaps)) == list(postings.docids)
+
+        # Skip pointers find the same index as a binary search
+        for _ in range(200):
+            target = rng.randrange(num_docs + 1)
+            lo = rng.randrange(len(postings.docids) + 1)
+            assert retrieval.gallop(actual.docids, target, lo) == max(
+                bisect.bisect_left(postings.docids, target), lo
+            )
+
+    assert [docid for docid, _ in retrieval.intersect(
+        [seg["all"].docids, seg["sparse"].docids, seg["far"].docids]
+    )] == sorted(set(text["sparse"]) & set(text["far"]))
+
+    # A posting takes 1 byte for the gap and 2 for the tf here, its weight
+    # is derived.  Each block adds a skip pointer, an end offset and two
+    # width bytes, and each document a docid and a norm.
+    num_postings = sum(len(docids) for docids in text.values())
+    num_blocks = num_postings // segment.BLOCK_SIZE + len(text)
+    assert segment_path.stat().st_size < 3 * num_postings + \
+        (4 + 4 + 2) * num_blocks + (4 + 8) * num_docs + 4096
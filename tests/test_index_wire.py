@@ -0,0 +1,65 @@
+"""Binary hits format tests."""
+import pytest
+import requests
+from index import wire
+from search import wire as search_wire
+from test_index_segment import TEXT_SEGMENTS, make_index_dir
+
+# We need to import test fixtures in specific test files because the fixture
+# imports student code (like the index server).  If the student isn't finished
+# with their code, then earlier tests (like pipeline tests) won't even run.
+# pylint: disable-next=unused-import
+from index_fixtures import setup_teardown_load_segment
+
+QUERY = "/api/v1/hits/?q=beverage+beverage&w=0.3"
+
+
+def as_response(flask_response):
+    """Return a requests.Response holding a Flask test client response."""
+    resp = requests.Response()
+    resp.status_code = flask_response.status_code
+    resp.headers.update(flask_response.headers)
+    # pylint: disable-next=protected-access
+    resp._content = flask_response.get_data()
+    return resp
+
+
+def test_negotiation(tmpdir, load_segment):
+    """Hits are JSON unless the client prefers the binary format.
+
+    'load_segment' is a fixture function that reloads the Index server with a
+    different segment and restores the default one afterward.
+    """
+    client = load_segment(make_index_dir(tmpdir, TEXT_SEGMENTS[1]))
+    response = client.get(QUERY)
+    assert response.mimetype == "application/json"
+    assert "Accept" in response.vary
+    hits = response.get_json()["hits"]
+    assert hits
+
+    response = client.get(QUERY, headers={"Accept": "*/*"})
+    assert response.mimetype == "application/json"
+
+    response = client.get(QUERY, headers={"Accept": search_wire.ACCEPT})
+    assert response.mimetype == wire.HITS_MEDIA_TYPE
+    assert "Accept" in response.vary
+    assert len(response.get_data()) == 4 + 12 * len(hits)
+    assert search_wire.response_hits(as_response(response)) == hits
+
+    # JSON responses decode the same way
+    response = client.get(QUERY)
+    assert search_wire.response_hits(as_response(response)) == hits
+
+
+def test_encode_decode():
+    """Binary hits round trip in rank order."""
+    hits = [(7, 0.75), (123456789, 0.5), (3, 0.5)]
+    body = wire.encode_hits(hits)
+    assert search_wire.decode_hits(body) == [
+        {"docid": docid, "score": score} for docid, score in hits
+    ]
+    assert search_wire.decode_hits(wire.encode_hits([])) == []
+
+    for bad in [b"", body[:-1], body + b"\0"]:
+        with pytest.raises(ValueError):
+            search_wire.decode_hits(bad)
@@ -0,0 +1,271 @@
+"""Search server scatter-gather client tests."""
+import json
+import threading
+import time
+import bs4
+import requests
+import search
+import utils
+from search.fanout import FanOut, FanOutConfig, ReplicaSet
+from search.views import views
+
+
+def fake_get(url, params, timeout):
+    """Stand in for requests.Session.get, one hit per segment URL."""
+    assert timeout > 0
+    response = requests.Response()
+    response.status_code = 200
+    docid = int(url.rsplit(":", 1)[1].split("/")[0])
+    # pylint: disable-next=protected-access
+    response._content = (
+        f'{{"hits": [{{"docid": {docid}, "score": {params["w"]}}}]}}'
+    ).encode()
+    return response
+
+
+def docids(segment_hits):
+    """Return the docids of each segment's hits."""
+    return [[hit["docid"] for hit in hits] for hits in segment_hits]
+
+
+def slow_get(delays):
+    """Return a fake_get that sleeps delays[port] seconds first."""
+    def get(url, params, timeout):
+        port = int(url.rsplit(":", 1)[1].split("/")[0])
+        time.sleep(delays.get(port, 0))
+        return fake_get(url, params, timeout)
+    return get
+
+
+def hits_url(port):
+    """Return the hits API URL of a fake Index server."""
+    return f"http://localhost:{port}/api/v1/hits/"
+
+
+def first_replica_first(mocker):
+    """Make power-of-two-choices ties go to the first listed replica."""
+    mocker.patch("random.sample", side_effect=lambda urls, k: urls[:k])
+
+
+def test_fanout_reused(mocker):
+    """One FanOut client serves every search until the URLs change.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    """
+    mocker.patch.object(requests.Session, "get", side_effect=fake_get)
+    urls = [hits_url(port) for port in range(3)]
+
+    mocker.patch.dict(search.app.config)
+    with search.app.app_context():
+        search.app.config["SEARCH_INDEX_SEGMENT_API_URLS"] = urls
+        hits, degraded = views.get_segment_hits("hello", "0.5", 10)
+        fanout = views.get_fanout(urls)
+        assert docids(hits) == [[0], [1], [2]]
+        assert not degraded
+        assert views.get_segment_hits("hello", "0.5", 10) == (hits, False)
+        assert views.get_fanout(urls) is fanout
+        assert len(fanout.sessions) == 3
+
+        # Changing the segment URLs replaces the client, while searches
+        # still running on the old one finish normally
+        search.app.config["SEARCH_INDEX_SEGMENT_API_URLS"] = urls[:2]
+        hits, _ = views.get_segment_hits("hello", "0.5", 10)
+        assert len(hits) == 2
+        assert views.get_fanout(urls[:2]) is not fanout
+        assert fanout.get({"q": "hello", "w": 0.5}) == (
+            [[{"docid": port, "score": 0.5}] for port in range(3)], False
+        )
+
+
+def test_fanout_segment_error(mocker):
+    """A failing segment contributes no hits instead of failing the search.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    """
+    def flaky_get(url, params, timeout):
+        if url.endswith(":1/api/v1/hits/"):
+            raise requests.ConnectionError(url)
+        return fake_get(url, params, timeout)
+
+    mocker.patch.object(requests.Session, "get", side_effect=flaky_get)
+    urls = [hits_url(port) for port in range(3)]
+    mocker.patch.dict(search.app.config)
+    with search.app.app_context():
+        search.app.config["SEARCH_INDEX_SEGMENT_API_URLS"] = urls
+        hits, degraded = views.get_segment_hits("hello", "0.5", 10)
+        assert docids(hits) == [[0], [], [2]]
+        assert degraded
+
+
+def test_deadline(mocker):
+    """Segments that miss the deadline are left out and marked degraded.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    """
+    mocker.patch.object(
+        requests.Session, "get", side_effect=slow_get({1: 1.0})
+    )
+    fanout = FanOut(
+        [hits_url(0), hits_url(1), hits_url(2)], FanOutConfig(deadline=0.2)
+    )
+    start = time.monotonic()
+    hits, degraded = fanout.get({"q": "hello", "w": 0.5})
+    assert time.monotonic() - start < 0.9
+    assert docids(hits) == [[0], [], [2]]
+    assert degraded
+    fanout.close()
+
+
+def test_deadline_queued(mocker):
+    """Fetches still queued at the deadline are cancelled, never sent.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    """
+    get = mocker.patch.object(requests.Session, "get", side_effect=fake_get)
+    fanout = FanOut(
+        [hits_url(0), hits_url(1)],
+        FanOutConfig(workers_per_segment=1, deadline=0.1),
+    )
+
+    # Keep every pool thread busy past the deadline
+    busy = threading.Event()
+    blockers = [fanout.executor.submit(busy.wait) for _ in range(2)]
+    hits, degraded = fanout.get({"q": "hello", "w": 0.5})
+    busy.set()
+    for blocker in blockers:
+        blocker.result()
+    assert hits == [[], []]
+    assert degraded
+    assert not get.called
+    assert all(
+        replica["outstanding"] == 0
+        for replicas in fanout.stats() for replica in replicas.values()
+    )
+
+    # A fetch that starts after the deadline is skipped
+    replicas = fanout.segments[0]
+    url = replicas.pick()
+    assert fanout.fetch(replicas, url, {}, time.monotonic()) is None
+    assert not get.called
+    assert replicas.stats()[url]["outstanding"] == 0
+    fanout.close()
+
+
+def test_hedged_replica(mocker):
+    """A slow segment is hedged to its next replica, which wins.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    """
+    get = mocker.patch.object(
+        requests.Session, "get", side_effect=slow_get({1: 1.0})
+    )
+    first_replica_first(mocker)
+    fanout = FanOut(
+        [hits_url(0), [hits_url(1), hits_url(11)], hits_url(2)],
+        FanOutConfig(deadline=0.8, hedge_after=0.1),
+    )
+    hits, degraded = fanout.get({"q": "hello", "w": 0.5})
+    assert docids(hits) == [[0], [11], [2]]
+    assert not degraded
+    assert sorted(call.args[0] for call in get.call_args_list) == \
+        sorted([hits_url(0), hits_url(1), hits_url(11), hits_url(2)])
+    fanout.close()
+
+
+def test_failover_replica(mocker):
+    """A failed replica is retried right away on the next one.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    """
+    def failing_get(url, params, timeout):
+        if url == hits_url(1):
+            raise requests.ConnectionError(url)
+        return fake_get(url, params, timeout)
+
+    get = mocker.patch.object(
+        requests.Session, "get", side_effect=failing_get
+    )
+    first_replica_first(mocker)
+    fanout = FanOut(
+        [[hits_url(1), hits_url(11)]],
+        FanOutConfig(eject_after=2, eject_seconds=60),
+    )
+    for _ in range(3):
+        assert fanout.get({"q": "hello", "w": 0.5}) == (
+            [[{"docid": 11, "score": 0.5}]], False
+        )
+
+    # After two failures in a row the replica is ejected and skipped
+    assert [call.args[0] for call in get.call_args_list] == [
+        hits_url(1), hits_url(11), hits_url(1), hits_url(11), hits_url(11),
+    ]
+    assert not fanout.stats()[0][hits_url(1)]["healthy"]
+    fanout.close()
+
+
+def test_least_outstanding():
+    """Of two replicas, the one with fewer requests in flight is picked."""
+    replicas = ReplicaSet([hits_url(1), hits_url(11)])
+    busy = replicas.pick()
+    idle = replicas.pick()
+    assert {busy, idle} == {hits_url(1), hits_url(11)}
+    replicas.finish(idle, True)
+    assert replicas.pick() == idle
+    assert replicas.pick(exclude={busy, idle}) is None
+
+
+def test_merge_hits():
+    """K-way merge of ranked segments matches sorting every hit."""
+    segment_hits = [
+        [{"docid": 4, "score": 0.9}, {"docid": 1, "score": 0.5}],
+        [{"docid": 2, "score": 0.9}, {"docid": 3, "score": 0.1}],
+        [],
+        [{"docid": 5, "score": 0.5}],
+    ]
+    everything = sorted(
+        (hit for hits in segment_hits for hit in hits), key=views.rank
+    )
+    for start in range(6):
+        for stop in range(start, 7):
+            assert views.merge_hits(segment_hits, start, stop) == \
+                everything[start:stop]
+
+
+def test_pagination(mocker):
+    """Each page holds the next page_size hits of the merged results.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    """
+    def ranked_get(url, params, timeout):
+        """Segment s holds docids s, s + 3, s + 6, ... in rank order."""
+        assert timeout > 0
+        segment = int(url.rsplit(":", 1)[1].split("/")[0])
+        hits = [
+            {"docid": docid, "score": 1.0 / (docid + 1)}
+            for docid in range(segment, 25, 3)
+        ][:params["k"]]
+        response = requests.Response()
+        response.status_code = 200
+        # pylint: disable-next=protected-access
+        response._content = json.dumps({"hits": hits}).encode()
+        return response
+
+    mocker.patch.object(requests.Session, "get", side_effect=ranked_get)
+    mocker.patch.dict(search.app.config, {
+        "SEARCH_INDEX_SEGMENT_API_URLS": [hits_url(p) for p in range(3)],
+        "SEARCH_DB_PATH": utils.TESTDATA_DIR/"search.sqlite3",
+        "SEARCH_PAGE_SIZE": 10,
+    })
+    client = search.app.test_client()
+
+    pages = []
+    for page in [1, 2, 3]:
+        response = client.get(f"/?q=hello&w=0.5&p={page}")
+        assert response.status_code == 200
+        soup = bs4.BeautifulSoup(response.data, "html.parser")
+        pages.append((
+            len(soup.find_all("div", {"class": "doc"})),
+            soup.find("a", {"class": "prev_page"}) is not None,
+            soup.find("a", {"class": "next_page"}) is not None,
+        ))
+    assert pages == [(10, False, True), (10, True, True), (5, True, False)]
@@ -0,0 +1,134 @@
+"""Search server document metadata tests."""
+import sqlite3
+import threading
+import pytest
+import search
+import utils
+from search import cache, model
+
+# We need to import test fixtures in specific test files because the fixture
+# imports student code (like the index server).  If the student isn't finished
+# with their code, then earlier tests (like pipeline tests) won't even run.
+# pylint: disable-next=unused-import
+from search_fixtures import setup_teardown_db_connection
+
+
+@pytest.fixture(name="search_app")
+def setup_teardown_search_app(mocker):
+    """Point the Search server at the test database inside an app context.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    """
+    mocker.patch.dict(search.app.config, {
+        "SEARCH_DB_PATH": utils.TESTDATA_DIR/"search.sqlite3",
+    })
+    with search.app.app_context():
+        yield search.app
+
+
+# pylint: disable-next=unused-argument
+def test_get_documents(search_app, db_connection):
+    """One batched lookup returns metadata in the requested order.
+
+    'db_connection' is a fixture function that provides direct access to
+    the search server's sqlite3 database.
+    """
+    docids = [74285, 35015, 123, 51163]
+    docs = model.get_documents(docids)
+    assert [doc["docid"] for doc in docs] == docids
+
+    for doc in docs:
+        row = db_connection.execute(
+            "SELECT title, summary, url FROM documents WHERE docid = ?",
+            (doc["docid"],),
+        ).fetchone() or {"title": "", "summary": "", "url": ""}
+        assert doc["title"] == row["title"]
+        assert doc["summary"] == (row["summary"] or "")
+        assert doc["url"] == row["url"]
+        assert doc["url_display"] == row["url"]
+
+    assert model.get_documents([]) == []
+
+
+# pylint: disable-next=unused-argument
+def test_connection_per_thread(search_app):
+    """Each thread reuses one read-only connection."""
+    conn = model.get_db()
+    assert model.get_db() is conn
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute("DELETE FROM documents")
+
+    other = []
+
+    def connect():
+        with search.app.app_context():
+            other.append(model.get_db())
+
+    thread = threading.Thread(target=connect)
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+
+
+def test_doc_cache_limits():
+    """Least recently used records are evicted to stay within limits."""
+    docs = [model.doc_info(docid, f"title {docid}") for docid in range(4)]
+    doc_cache = cache.DocCache(max_entries=2, max_bytes=1 << 20)
+    for doc in docs[:3]:
+        doc_cache.put(doc)
+    assert doc_cache.get_many([0, 1, 2]) == {1: docs[1], 2: docs[2]}
+
+    # Byte budget for two records
+    doc_cache = cache.DocCache(
+        max_entries=100, max_bytes=2 * cache.record_size(docs[0])
+    )
+    for doc in docs:
+        doc_cache.put(doc)
+    assert list(doc_cache.get_many(range(4))) == [2, 3]
+
+    stats = doc_cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+    assert stats["hit_rate"] == 0.5
+
+
+# pylint: disable-next=unused-argument
+def test_doc_cache(search_app, mocker):
+    """Cached records are served without querying the database.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    """
+    mocker.patch.dict(search_app.extensions)
+    search_app.extensions.pop("search_doc_cache", None)
+    spy = mocker.spy(model, "query_documents")
+
+    first = model.get_documents([74285, 35015])
+    assert model.get_documents([35015, 74285]) == first[::-1]
+    assert spy.call_count == 1
+    model.get_documents([51163, 74285])
+    assert spy.call_args.args == ([51163],)
+
+    stats = search_app.test_client().get("/cache/").get_json()
+    assert stats["hits"] == 3
+    assert stats["misses"] == 3
+
+
+# pylint: disable-next=unused-argument
+def test_doc_cache_warmup(search_app, mocker, tmpdir):
+    """Warm-up preloads the highest-PageRank documents.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    """
+    mocker.patch.dict(search_app.extensions)
+    search_app.extensions.pop("search_doc_cache", None)
+    pagerank_path = tmpdir/"pagerank.out"
+    pagerank_path.write_text(
+        "35015,0.1\n51163,0.3\n74285,0.2\n", encoding="utf-8"
+    )
+
+    assert model.warm_doc_cache(pagerank_path, 2) == 2
+    spy = mocker.spy(model, "query_documents")
+    model.get_documents([51163, 74285])
+    assert spy.call_count == 0
+    model.get_documents([35015])
+    assert spy.call_args.args == ([35015],)